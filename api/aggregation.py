@@ -0,0 +1,164 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DATE_COLUMN = "Pstng Date"
+
+# Group-by keys accepted by the aggregation endpoint and the output column they produce.
+# Any other value is used as a column name as-is.
+COLUMN_KEYS = {"material": "Material Number", "plant": "Plant", "site": "Site", "vendor": "Vendor Number", "supplier": "Supplier"}
+DATE_KEYS = {"day": "Day", "week": "Week", "month": "Month", "quarter": "Quarter"}
+
+# Metric name -> (pandas aggregation, output column); "{value}" is replaced by the value column
+METRICS = {
+    "count": ("size", "Transaction Count"),
+    "sum": ("sum", "{value}"),
+    "mean": ("mean", "{value} Mean"),
+    "std": ("std", "{value} Std"),
+    "var": ("var", "{value} Variance"),
+    "min": ("min", "{value} Min"),
+    "max": ("max", "{value} Max"),
+}
+
+MAX_MEMOIZED_QUERIES = 64
+
+def _date_key(dates, key):
+    """
+    Buckets dates the way the dashboard charts do (date-fns startOfWeek/startOfMonth).
+
+    Grouping happens on the datetime bucket; only the resulting unique keys are formatted.
+    """
+    days = dates.dt.normalize()
+    if key == "day":
+        return days
+    if key == "week":
+        return days - pd.to_timedelta((days.dt.dayofweek + 1) % 7, unit="D")  # weeks start on Sunday
+    if key == "month":
+        return days.dt.to_period("M").dt.start_time
+    return days.dt.to_period("Q").dt.start_time
+
+def _format_date_key(values, key):
+    if key in ("day", "week"):
+        return values.dt.strftime("%Y-%m-%d")
+    if key == "month":
+        return values.dt.strftime("%Y-%m")
+    return values.dt.year.astype(str) + "-Q" + values.dt.quarter.astype(str)
+
+def normalize_query(query):
+    """Validates an aggregation query and fills in defaults, raising ValueError when invalid."""
+    group_by = query.get("group_by") or ["material"]
+    if isinstance(group_by, str):
+        group_by = [group_by]
+    metrics = query.get("metrics") or ["count", "sum"]
+    if isinstance(metrics, str):
+        metrics = [metrics]
+    unknown = [metric for metric in metrics if metric not in METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)}. Supported: {', '.join(METRICS)}")
+
+    sort_by = query.get("sort_by") or metrics[0]
+    if sort_by not in metrics:
+        raise ValueError(f"sort_by must be one of the requested metrics: {', '.join(metrics)}")
+
+    top_k = query.get("top_k")
+    if top_k is not None and int(top_k) < 1:
+        raise ValueError("top_k must be a positive integer")
+
+    return {
+        "group_by": list(group_by),
+        "metrics": list(metrics),
+        "value_column": query.get("value_column") or "Quantity",
+        "sort_by": sort_by,
+        "top_k": int(top_k) if top_k is not None else None,
+    }
+
+def aggregate(df, query):
+    """
+    Groups a dataset and computes the requested metrics over its value column.
+
+    Args:
+        df (pandas.DataFrame): Cleaned dataset.
+        query (dict): Normalized query (see normalize_query). group_by keys are
+            material/plant/site/vendor/supplier, day/week/month/quarter of 'Pstng Date',
+            or column names; metrics are count/sum/mean/std/var/min/max; top_k keeps
+            the k best values of the first group key ranked by sort_by.
+
+    Returns:
+        pandas.DataFrame: One row per group, sorted by sort_by descending.
+    """
+    value_column = query["value_column"]
+    keys = {}
+    for key in query["group_by"]:
+        if key in DATE_KEYS:
+            if DATE_COLUMN not in df.columns:
+                raise ValueError(f"Grouping by {key} requires a '{DATE_COLUMN}' column")
+            keys[DATE_KEYS[key]] = _date_key(pd.to_datetime(df[DATE_COLUMN], errors="coerce"), key)
+        else:
+            col = COLUMN_KEYS.get(key, key)
+            if col not in df.columns:
+                raise ValueError(f"Unknown group-by column: {col}")
+            keys[col] = df[col]
+
+    needs_values = any(metric != "count" for metric in query["metrics"])
+    if needs_values and value_column not in df.columns:
+        raise ValueError(f"Unknown value column: {value_column}")
+
+    frame = pd.DataFrame(keys)
+    if needs_values:
+        values = pd.to_numeric(df[value_column], errors="coerce")
+        # Compacted datasets hold float32 / small integer columns; aggregate them at full width
+        if values.dtype.kind in "fiu":
+            values = values.astype("float64" if values.dtype.kind == "f" else "int64")
+        frame["__value"] = values
+    grouped = frame.groupby(list(keys), sort=False, observed=True, dropna=True)
+
+    columns = {}
+    for metric in query["metrics"]:
+        how, name = METRICS[metric]
+        name = name.format(value=value_column)
+        columns[name] = grouped.size() if how == "size" else grouped["__value"].agg(how)
+    result = pd.DataFrame(columns)
+
+    result = result.reset_index()
+    for key in query["group_by"]:
+        if key in DATE_KEYS:
+            result[DATE_KEYS[key]] = _format_date_key(result[DATE_KEYS[key]], key)
+
+    sort_name = METRICS[query["sort_by"]][1].format(value=value_column)
+    if query["top_k"] is not None:
+        if len(keys) == 1:
+            result = result.nlargest(query["top_k"], sort_name)
+        else:
+            # Rank the first key on its own (e.g. top materials), then keep all of their buckets
+            first_key = list(keys)[0]
+            ranking = aggregate(df, dict(query, group_by=query["group_by"][:1]))
+            result = result[result[first_key].isin(ranking[first_key])]
+
+    return result.sort_values(sort_name, ascending=False, ignore_index=True)
+
+class AggregationMemo:
+    """Small LRU of aggregation results for one dataset, keyed by the normalized query. Thread-safe."""
+
+    def __init__(self, max_entries=MAX_MEMOIZED_QUERIES):
+        self.max_entries = max_entries
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, query, filters, compute):
+        """Returns the memoized result for (query, filters), calling compute() on a miss."""
+        key = json.dumps([query, filters], sort_keys=True, default=str)
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+        # Computed outside the lock, so other queries are not held up by this one
+        result = compute()
+        with self._lock:
+            self._results[key] = result
+            if len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+        return result
@@ -0,0 +1,153 @@
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever a rule below changes, so cached results from older rules are not reused.
+CLEANING_VERSION = 2
+
+# Text columns with at most this share of distinct values are stored as categoricals
+CATEGORY_MAX_RATIO = 0.5
+
+# Date columns of the SAP exports. Excel stores them as dates; text formats (CSV) carry
+# them as dd/mm/yyyy [hh:mm:ss AM/PM] strings that readers parse day-first (api.file_formats)
+SAP_DATE_COLUMNS = ["Pstng Date", "SLED/BBD", "Document Date"]
+
+# Declarative cleaning rules shared by the upload endpoints.
+#   fill_unknown:     replace empty / missing text values with "Unknown"
+#   datetime_columns: coerced with pd.to_datetime(errors='coerce')
+#   numeric_columns:  coerced with pd.to_numeric(errors='coerce')
+#   absolute_columns: negative quantities converted to positive
+# Columns that are not present in the uploaded file are skipped.
+MATERIAL_CONSUMPTION = {
+    "fill_unknown": True,
+    "datetime_columns": ["Pstng Date", "SLED/BBD"],
+    "numeric_columns": [],
+    "absolute_columns": ["Quantity", "Quantity in UnE"],
+}
+
+ORDER_PLACEMENT = {
+    "fill_unknown": False,
+    "datetime_columns": [],
+    "numeric_columns": ["Order Quantity"],
+    "absolute_columns": [],
+}
+
+GOODS_RECEIPT = {
+    "fill_unknown": True,
+    "datetime_columns": ["Pstng Date", "SLED/BBD"],
+    "numeric_columns": [],
+    "absolute_columns": ["Quantity"],
+}
+
+UNKNOWN = "Unknown"
+
+def _clean_text_column(series, fill_unknown):
+    """Strips string cells and optionally fills blanks, without a Python call per cell."""
+    try:
+        stripped = series.str.strip()
+    except AttributeError:
+        stripped = None  # object column without any strings (e.g. only numbers or dates)
+    if stripped is not None:
+        # .str returns NaN for non-string cells (numbers, dates) in mixed columns, keep those as-is
+        series = stripped.where(stripped.notna(), series)
+    if fill_unknown:
+        series = series.mask(series.isna() | (series == ""), UNKNOWN)
+    return series
+
+def clean_dataframe(data, spec):
+    """
+    Cleans an uploaded DataFrame (or a chunk of one) according to a cleaning spec.
+
+    Only object columns go through the string operations; numeric columns are left
+    untouched apart from the numeric/absolute rules that name them explicitly.
+
+    Args:
+        data (pandas.DataFrame): Raw DataFrame as read from the upload.
+        spec (dict): One of the specs defined in this module.
+
+    Returns:
+        pandas.DataFrame: The cleaned DataFrame.
+    """
+    data = data.copy(deep=False)
+    data.columns = data.columns.astype(str).str.strip()
+
+    datetime_columns = [col for col in spec["datetime_columns"] if col in data.columns]
+    numeric_columns = [col for col in spec["numeric_columns"] if col in data.columns]
+    absolute_columns = [col for col in spec["absolute_columns"] if col in data.columns]
+    fill_unknown = spec["fill_unknown"]
+
+    for col in data.columns:
+        series = data[col]
+        if series.dtype == object:
+            data[col] = _clean_text_column(series, fill_unknown)
+        elif fill_unknown and series.dtype.kind == "M" and col not in datetime_columns and series.isna().any():
+            # Missing dates outside the datetime rules are reported as "Unknown", like text
+            data[col] = series.astype(object).where(series.notna(), UNKNOWN)
+
+    for col in datetime_columns:
+        data[col] = pd.to_datetime(data[col], errors="coerce")
+
+    for col in numeric_columns:
+        data[col] = pd.to_numeric(data[col], errors="coerce")
+
+    for col in absolute_columns:
+        data[col] = pd.to_numeric(data[col], errors="coerce").abs()
+
+    logger.info(f"Cleaned {len(data)} rows x {len(data.columns)} columns")
+    return data
+
+def _exact_float32(series):
+    """float32 copy of a float64 column when every value survives the round trip, else None."""
+    values = series.to_numpy()
+    narrow = values.astype("float32")
+    same = (narrow.astype("float64") == values) | (np.isnan(values) & np.isnan(narrow))
+    return pd.Series(narrow, index=series.index, name=series.name) if same.all() else None
+
+def compact_dataframe(data, max_category_ratio=CATEGORY_MAX_RATIO):
+    """
+    Shrinks a cleaned DataFrame's in-memory representation without changing its values.
+
+    Repetitive text columns (Material Number, Plant, Site, Batch, ...) become categoricals,
+    integers are downcast to the smallest integer type, floats to float32 when that is
+    exact (e.g. whole quantities), and object columns holding only dates become datetime64.
+    Mixed columns (e.g. dates plus "Unknown") are left as they are.
+
+    Args:
+        data (pandas.DataFrame): Cleaned DataFrame.
+        max_category_ratio (float): Largest share of distinct values for a categorical.
+
+    Returns:
+        pandas.DataFrame: The compacted DataFrame, with the bytes before/after and the converted
+        columns in attrs["compaction"].
+    """
+    bytes_before = int(data.memory_usage(deep=True, index=False).sum())
+    data = data.copy(deep=False)
+    converted = {}
+    for col in data.columns:
+        series = data[col]
+        compacted = None
+        if series.dtype == object:
+            kind = pd.api.types.infer_dtype(series, skipna=True)
+            if kind == "string" and series.nunique() <= max_category_ratio * len(series):
+                compacted = series.astype("category")
+            elif kind in ("datetime", "datetime64"):
+                compacted = pd.to_datetime(series, errors="coerce")
+        elif pd.api.types.is_integer_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+            compacted = pd.to_numeric(series, downcast="integer")
+        elif series.dtype == np.float64:
+            compacted = _exact_float32(series)
+        if compacted is not None and compacted.dtype != series.dtype:
+            data[col] = compacted
+            converted[col] = str(compacted.dtype)
+
+    bytes_after = int(data.memory_usage(deep=True, index=False).sum())
+    data.attrs["compaction"] = {
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "saved_bytes": bytes_before - bytes_after,
+        "converted": converted,
+    }
+    logger.info(f"Compacted {len(data)} rows from {bytes_before / 1e6:.1f} MB to {bytes_after / 1e6:.1f} MB")
+    return data
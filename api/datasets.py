@@ -0,0 +1,125 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+DATASET_TTL_SECONDS = config("DATASET_TTL_SECONDS", default=1800, cast=int)
+# Registered datasets kept at most, and their total memory (DataFrames plus indexes);
+# beyond either limit the least recently used datasets are dropped before their TTL
+DATASET_MAX_ENTRIES = config("DATASET_MAX_ENTRIES", default=32, cast=int)
+DATASET_MAX_MB = config("DATASET_MAX_MB", default=2048, cast=int)
+
+class DatasetSession:
+    """A cleaned DataFrame registered by an upload, plus per-dataset derived state."""
+
+    def __init__(self, dataset_id, df, source):
+        self.dataset_id = dataset_id
+        self.df = df
+        self.source = source
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        # Derived structures (indexes, memoized query results) keyed by name, dropped with the session
+        self.derived = {}
+
+    def memory(self):
+        """
+        Memory held by the DataFrame, what dtype compaction saved (api.cleaning.compact_dataframe),
+        and the memory held by derived indexes (anything in derived exposing nbytes, e.g. the FilterIndex).
+        """
+        if "memory" not in self.derived:
+            compaction = self.df.attrs.get("compaction", {})
+            memory_bytes = int(self.df.memory_usage(deep=True, index=False).sum())
+            self.derived["memory"] = {
+                "memory_bytes": memory_bytes,
+                "memory_saved_bytes": compaction.get("saved_bytes", 0),
+                "compacted_columns": compaction.get("converted", {}),
+            }
+        index_bytes = sum(int(getattr(value, "nbytes", 0)) for value in self.derived.values())
+        return {**self.derived["memory"], "index_bytes": index_bytes}
+
+    def memory_total(self):
+        memory = self.memory()
+        return memory["memory_bytes"] + memory["index_bytes"]
+
+    def info(self, ttl_seconds):
+        return {
+            "dataset_id": self.dataset_id,
+            "source": self.source,
+            "rows": len(self.df),
+            "columns": [str(col) for col in self.df.columns],
+            **self.memory(),
+            "expires_in": max(0, int(self.last_used + ttl_seconds - time.time())),
+        }
+
+class DatasetStore:
+    """
+    Server-side registry of uploaded datasets with sliding TTL eviction.
+
+    Upload endpoints register their cleaned DataFrame once and hand the ID to the
+    client, so filter/visualization calls can reference it instead of posting rows back.
+    Over max_entries datasets or max_bytes of memory (DataFrames plus their indexes),
+    the least recently used datasets are evicted early.
+    """
+
+    def __init__(self, ttl_seconds, max_entries=None, max_bytes=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()  # least recently used first
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, now):
+        expired = [key for key, session in self._sessions.items() if now - session.last_used > self.ttl_seconds]
+        for key in expired:
+            del self._sessions[key]
+        if expired:
+            logger.info(f"Evicted {len(expired)} expired dataset(s)")
+
+    def _evict_over_limits(self, keep):
+        """Drops least recently used sessions (never keep) until the entry and memory limits hold."""
+        total = sum(session.memory_total() for session in self._sessions.values())
+        evicted = 0
+        for key in list(self._sessions):
+            over_entries = self.max_entries is not None and len(self._sessions) > self.max_entries
+            over_bytes = self.max_bytes is not None and total > self.max_bytes
+            if not (over_entries or over_bytes):
+                break
+            if key == keep:
+                continue
+            total -= self._sessions.pop(key).memory_total()
+            evicted += 1
+        if evicted:
+            logger.info(f"Evicted {evicted} least recently used dataset(s), {len(self._sessions)} left using {total / 1e6:.1f} MB")
+
+    def register(self, df, source):
+        dataset_id = uuid.uuid4().hex
+        with self._lock:
+            self._evict_expired(time.time())
+            self._sessions[dataset_id] = DatasetSession(dataset_id, df, source)
+            self._evict_over_limits(dataset_id)
+        saved = df.attrs.get("compaction", {}).get("saved_bytes", 0)
+        logger.info(f"Registered dataset {dataset_id} from {source} ({len(df)} rows, {saved / 1e6:.1f} MB saved by compaction)")
+        return dataset_id
+
+    def get(self, dataset_id):
+        """Returns the DatasetSession for dataset_id and refreshes its TTL, or None if unknown/expired."""
+        now = time.time()
+        with self._lock:
+            self._evict_expired(now)
+            session = self._sessions.get(dataset_id)
+            if session is not None:
+                session.last_used = now
+                self._sessions.move_to_end(dataset_id)
+                # Indexes built since the last check count against the limits too
+                self._evict_over_limits(dataset_id)
+            return session
+
+    def remove(self, dataset_id):
+        with self._lock:
+            return self._sessions.pop(dataset_id, None) is not None
+
+dataset_store = DatasetStore(DATASET_TTL_SECONDS, DATASET_MAX_ENTRIES, DATASET_MAX_MB * 1024 * 1024)
@@ -0,0 +1,88 @@
+import logging
+import os
+import pandas as pd
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+try:
+    import python_calamine  # noqa: F401  (only needed by pandas' calamine engine)
+    HAS_CALAMINE = True
+except ImportError:
+    HAS_CALAMINE = False
+
+# "auto" uses calamine when it is installed and falls back to openpyxl otherwise
+# (or to pandas' own choice, e.g. xlrd, for legacy .xls workbooks openpyxl cannot read)
+EXCEL_ENGINE = config("EXCEL_ENGINE", default="auto")
+
+ENGINES = ("calamine", "openpyxl")
+
+# Leading bytes of an OLE2 compound file, the container of legacy .xls workbooks
+XLS_SIGNATURE = b"\xd0\xcf\x11\xe0"
+
+def available_engines():
+    """Excel engines usable in this environment, fastest first."""
+    return [engine for engine in ENGINES if engine != "calamine" or HAS_CALAMINE]
+
+def is_legacy_xls(source):
+    """True when source is a legacy .xls workbook (by extension, or by its leading bytes)."""
+    if isinstance(source, (str, os.PathLike)):
+        if os.fspath(source).lower().endswith(".xls"):
+            return True
+        try:
+            with open(source, "rb") as f:
+                head = f.read(len(XLS_SIGNATURE))
+        except OSError:
+            return False
+    elif hasattr(source, "read") and hasattr(source, "seek"):
+        position = source.tell()
+        head = source.read(len(XLS_SIGNATURE))
+        source.seek(position)
+    else:
+        return False
+    return head == XLS_SIGNATURE
+
+def resolve_engine(engine=None, source=None):
+    """
+    Picks the engine to use: the explicit one, else EXCEL_ENGINE, else the fastest available.
+
+    openpyxl only reads .xlsx/.xlsm, so where it would be picked for a legacy .xls source
+    None is returned instead and pandas chooses the engine (xlrd), as it did before.
+    """
+    engine = engine or EXCEL_ENGINE
+    if engine == "auto":
+        engine = available_engines()[0]
+    elif engine not in ENGINES:
+        raise ValueError(f"Unknown Excel engine: {engine}. Supported: auto, {', '.join(ENGINES)}")
+    elif engine == "calamine" and not HAS_CALAMINE:
+        logger.warning("python-calamine is not installed, falling back to openpyxl")
+        engine = "openpyxl"
+    if engine == "openpyxl" and source is not None and is_legacy_xls(source):
+        return None
+    return engine
+
+def read_excel(source, usecols=None, dtype=None, engine=None, **kwargs):
+    """
+    Reads an Excel sheet into a DataFrame with the fastest available engine.
+
+    Args:
+        source: Path or file-like object of the workbook.
+        usecols: Columns to parse (names, letters or a callable), as in pd.read_excel.
+        dtype: Column dtype hints, as in pd.read_excel.
+        engine (str): "calamine", "openpyxl" or "auto"; defaults to EXCEL_ENGINE.
+        **kwargs: Passed through to pd.read_excel.
+
+    Returns:
+        pandas.DataFrame: The parsed sheet.
+    """
+    engine = resolve_engine(engine, source)
+    try:
+        return pd.read_excel(source, engine=engine, usecols=usecols, dtype=dtype, **kwargs)
+    except ValueError as e:
+        # pandas < 2.2 has no calamine engine
+        if engine != "calamine" or "engine" not in str(e).lower():
+            raise
+        logger.warning(f"calamine engine unavailable in this pandas version ({e}), falling back to openpyxl")
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return pd.read_excel(source, engine=None if is_legacy_xls(source) else "openpyxl", usecols=usecols, dtype=dtype, **kwargs)
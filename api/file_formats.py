@@ -0,0 +1,160 @@
+import io
+import logging
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from api.cleaning import SAP_DATE_COLUMNS
+from api.excel_reader import read_excel
+
+logger = logging.getLogger(__name__)
+
+EXCEL_EXTENSIONS = (".xlsx", ".xls")
+CSV_EXTENSIONS = (".csv",)
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+UPLOAD_EXTENSIONS = EXCEL_EXTENSIONS + CSV_EXTENSIONS + PARQUET_EXTENSIONS
+
+# Explicit CSV column types, so identifiers are never guessed as numbers and
+# quantities are never guessed as strings. Columns missing from a file are ignored.
+CSV_QUANTITY_COLUMNS = ["Quantity", "Quantity in UnE", "Order Quantity"]
+CSV_DATE_COLUMNS = SAP_DATE_COLUMNS
+CSV_COLUMN_TYPES = {
+    "Material Number": pa.string(),
+    "Plant": pa.string(),
+    "Site": pa.string(),
+    "Vendor Number": pa.string(),
+    "Supplier": pa.string(),
+    "Batch": pa.string(),
+    # Read as float64 so a decimal in a later block cannot break the parse; whole-number
+    # columns are turned back into int64 below, as the Excel reader returns them
+    **{col: pa.float64() for col in CSV_QUANTITY_COLUMNS},
+    # Dates are read as text and parsed below with the SAP export's day-first formats
+    **{col: pa.string() for col in CSV_DATE_COLUMNS},
+}
+CSV_DATE_FORMATS = ["%d/%m/%Y %I:%M:%S %p", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y"]
+
+# Block size of the multi-threaded CSV reader; each block is parsed by its own thread
+CSV_BLOCK_SIZE = 4 * 1024 * 1024
+
+def _skip_invalid_row(row):
+    # Truncated / malformed lines (e.g. a partially written last row) are dropped, not fatal
+    logger.warning(f"Skipping malformed CSV row (expected {row.expected_columns} columns, got {row.actual_columns}): {row.text[:200]}")
+    return "skip"
+
+def _csv_options(columns):
+    read_options = pa_csv.ReadOptions(use_threads=True, block_size=CSV_BLOCK_SIZE)
+    parse_options = pa_csv.ParseOptions(invalid_row_handler=_skip_invalid_row)
+    convert_options = pa_csv.ConvertOptions(column_types=CSV_COLUMN_TYPES, include_columns=columns)
+    return {"read_options": read_options, "parse_options": parse_options, "convert_options": convert_options}
+
+def detect_format(filename, head=b""):
+    """Returns 'excel', 'csv' or 'parquet' from the file extension, or from the leading bytes."""
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension in EXCEL_EXTENSIONS:
+        return "excel"
+    if extension in CSV_EXTENSIONS:
+        return "csv"
+    if extension in PARQUET_EXTENSIONS:
+        return "parquet"
+    if head.startswith(b"PAR1"):
+        return "parquet"
+    if head.startswith(b"PK") or head.startswith(b"\xd0\xcf\x11\xe0"):
+        return "excel"
+    return "csv"
+
+def _parse_day_first_dates(series):
+    parsed = pd.Series(pd.NaT, index=series.index, dtype="datetime64[ns]")
+    for date_format in CSV_DATE_FORMATS:
+        missing = parsed.isna() & series.notna()
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(series[missing].str.strip(), format=date_format, errors="coerce")
+    return parsed
+
+def _convert_csv_columns(df):
+    """Parses the date columns day-first and gives whole-number quantity columns an integer dtype."""
+    for col in CSV_DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = _parse_day_first_dates(df[col])
+    for col in CSV_QUANTITY_COLUMNS:
+        if col in df.columns:
+            values = df[col].to_numpy()
+            # With missing values the column stays float64, as in the Excel path
+            if not np.isnan(values).any() and np.array_equal(values, np.trunc(values)) and np.abs(values).max(initial=0) < 2**53:
+                df[col] = values.astype("int64")
+    return df
+
+def read_csv(source, columns=None):
+    """
+    Reads a CSV export with pyarrow's multi-threaded, block-wise parser.
+
+    Args:
+        source: Path or file-like object.
+        columns (list): Optional projection; only these columns are converted.
+
+    Returns:
+        pandas.DataFrame: Parsed data, with the date columns parsed as dd/mm/yyyy [hh:mm:ss AM/PM]
+        and whole-number quantities as integers.
+    """
+    try:
+        table = pa_csv.read_csv(source, **_csv_options(columns))
+    except pa.ArrowKeyError as e:
+        raise ValueError(str(e)) from None
+    return _convert_csv_columns(table.to_pandas())
+
+def iter_csv_chunks(source, columns=None):
+    """Yields a CSV export as DataFrames, one per parsed block, for the NDJSON streaming mode."""
+    reader = pa_csv.open_csv(source, **_csv_options(columns))
+    for batch in reader:
+        yield _convert_csv_columns(batch.to_pandas())
+
+def read_parquet(source, columns=None):
+    """Reads a Parquet file, decoding only the projected columns when given."""
+    parquet_file = pq.ParquetFile(source)
+    if columns:
+        missing = [col for col in columns if col not in parquet_file.schema_arrow.names]
+        if missing:
+            raise ValueError(f"Columns not found in Parquet file: {', '.join(missing)}")
+    return parquet_file.read(columns=columns).to_pandas()
+
+def read_upload(source, filename, columns=None):
+    """
+    Parses an upload as Excel, CSV or Parquet.
+
+    Args:
+        source: Uploaded file contents (bytes) or the path of a spooled upload. Paths are
+            memory-mapped for CSV and Parquet and opened directly for Excel, so the file is
+            never read into a bytes object.
+        filename (str): Uploaded file name, used to pick the format.
+        columns (list): Optional column projection applied while parsing.
+
+    Returns:
+        pandas.DataFrame: Parsed, uncleaned data.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        file_format = detect_format(filename, bytes(source[:8]))
+        logger.info(f"Reading {filename} as {file_format}")
+        return _read_format(io.BytesIO(source), file_format, columns)
+
+    with open(source, "rb") as f:
+        file_format = detect_format(filename, f.read(8))
+    logger.info(f"Reading {filename} as {file_format}")
+    if file_format == "excel" or os.path.getsize(source) == 0:
+        return _read_format(source, file_format, columns)
+    with pa.memory_map(source) as mapped:
+        return _read_format(mapped, file_format, columns)
+
+def _read_format(source, file_format, columns):
+    if file_format == "csv":
+        return read_csv(source, columns)
+    if file_format == "parquet":
+        return read_parquet(source, columns)
+    return read_excel(source, usecols=columns)
+
+def parse_columns_param(columns):
+    """Splits a comma-separated ?columns= query parameter into a list (None when absent)."""
+    if not columns:
+        return None
+    return [col.strip() for col in columns.split(",") if col.strip()]
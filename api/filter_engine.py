@@ -0,0 +1,202 @@
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Columns indexed up front when a dataset is registered; any other column is indexed on first use
+INDEXED_COLUMNS = ["Plant", "Site", "Supplier", "Material Number", "Vendor Number"]
+DATE_COLUMN = "Pstng Date"
+
+# Up to this many distinct values a column is filtered by scanning its codes, above it
+# (e.g. Material Number) it also keeps per-value row lists so a lookup touches only its rows
+ROW_LIST_MIN_CARDINALITY = 256
+
+# Keys of the legacy filter payload and the columns they refer to
+FILTER_ALIASES = {"plants": "Plant", "suppliers": "Supplier", "sites": "Site", "materials": "Material Number", "vendors": "Vendor Number"}
+
+class ColumnIndex:
+    """Dictionary encoding of one column: one small integer code per row, plus per-value row lists for high-cardinality columns."""
+
+    def __init__(self, series):
+        codes, uniques = pd.factorize(series, sort=False)
+        self.num_rows = len(codes)
+        self.lookup = {value: code for code, value in enumerate(uniques.tolist())}
+        # int8 for most categorical columns: one byte per row instead of one bool array per value
+        self.codes = codes.astype(np.min_scalar_type(-max(len(uniques), 1)), copy=False)
+        self.rows_by_code = None
+        self.offsets = None
+        if len(uniques) > ROW_LIST_MIN_CARDINALITY:
+            # Row ids grouped by code: rows of code c are order[offsets[c]:offsets[c + 1]]
+            row_dtype = np.int32 if len(codes) < 2**31 else np.int64
+            order = np.argsort(self.codes, kind="stable").astype(row_dtype, copy=False)
+            counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+            self.rows_by_code = order[len(codes) - counts.sum():]  # missing values (code -1) sort first
+            self.offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    @property
+    def nbytes(self):
+        size = self.codes.nbytes
+        if self.rows_by_code is not None:
+            size += self.rows_by_code.nbytes + self.offsets.nbytes
+        return size
+
+    def mask(self, values):
+        """Boolean row mask for 'column IN values'."""
+        codes = self._codes(values)
+        if len(codes) == 1:
+            return self.codes == codes[0]
+        return np.isin(self.codes, codes)
+
+    def rows(self, values):
+        """Sorted row positions for 'column IN values' (row list columns)."""
+        parts = [self.rows_by_code[self.offsets[code]:self.offsets[code + 1]] for code in self._codes(values)]
+        if not parts:
+            return np.empty(0, dtype=np.intp)
+        return parts[0] if len(parts) == 1 else np.sort(np.concatenate(parts))
+
+    def contains(self, rows, values):
+        """Subset of the given row positions whose value is in values."""
+        return rows[np.isin(self.codes[rows], self._codes(values))]
+
+    def _codes(self, values):
+        return [self.lookup[value] for value in values if value in self.lookup]
+
+class DateIndex:
+    """Sorted index on a datetime column, resolving ranges with binary search."""
+
+    def __init__(self, series):
+        values = pd.to_datetime(series, errors="coerce").to_numpy(dtype="datetime64[ns]")
+        valid = ~np.isnat(values)
+        self.values = values
+        self.num_rows = len(values)
+        positions = np.flatnonzero(valid).astype(np.int32 if len(values) < 2**31 else np.int64, copy=False)
+        order = np.argsort(values[valid], kind="stable")
+        self.sorted_values = values[valid][order]
+        self.sorted_rows = positions[order]
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.sorted_values.nbytes + self.sorted_rows.nbytes
+
+    @staticmethod
+    def _bound(value):
+        return None if value is None else np.datetime64(pd.Timestamp(value), "ns")
+
+    def rows(self, start=None, end=None):
+        """Sorted row positions with start <= date <= end (either bound optional)."""
+        start, end = self._bound(start), self._bound(end)
+        lo = 0 if start is None else np.searchsorted(self.sorted_values, start, side="left")
+        hi = len(self.sorted_values) if end is None else np.searchsorted(self.sorted_values, end, side="right")
+        return np.sort(self.sorted_rows[lo:hi])
+
+    def contains(self, rows, start=None, end=None):
+        """Subset of the given row positions whose date falls in the range."""
+        start, end = self._bound(start), self._bound(end)
+        values = self.values[rows]
+        keep = ~np.isnat(values)
+        if start is not None:
+            keep &= values >= start
+        if end is not None:
+            keep &= values <= end
+        return rows[keep]
+
+class FilterIndex:
+    """
+    Multi-column filter engine for one dataset.
+
+    Each predicate resolves to a row list or a scan of the column's dictionary
+    codes (or a range of the sorted date index), and those are intersected, so a
+    filter never rescans the column values themselves.
+
+    The columns given, and the date column, are indexed when the FilterIndex is
+    built; an index built with columns=[] indexes everything on first use.
+    """
+
+    def __init__(self, df, columns=INDEXED_COLUMNS, date_column=DATE_COLUMN):
+        self.df = df
+        self.date_column = date_column
+        self._columns = {}
+        self._date_index = None
+        for col in columns:
+            if col in df.columns:
+                self.column_index(col)
+        if columns and date_column in df.columns:
+            self.date_index()
+
+    @property
+    def nbytes(self):
+        """Memory held by the column and date indexes built so far."""
+        size = sum(index.nbytes for index in self._columns.values())
+        if self._date_index is not None:
+            size += self._date_index.nbytes
+        return size
+
+    def column_index(self, col):
+        if col not in self._columns:
+            if col not in self.df.columns:
+                raise ValueError(f"Unknown filter column: {col}")
+            self._columns[col] = ColumnIndex(self.df[col])
+        return self._columns[col]
+
+    def date_index(self):
+        if self._date_index is None:
+            if self.date_column not in self.df.columns:
+                raise ValueError(f"Unknown filter column: {self.date_column}")
+            self._date_index = DateIndex(self.df[self.date_column])
+        return self._date_index
+
+    def rows(self, filters):
+        """
+        Resolves a filter payload to the sorted positions of the matching rows.
+
+        Supported keys:
+            plants / suppliers / sites / materials / vendors: list of allowed values
+            date_from / date_to: inclusive 'Pstng Date' range (any pandas-parsable date)
+            any column name: a single value (equality) or a list of values (IN)
+
+        Selective row-list predicates (e.g. Material Number) are intersected first,
+        the remaining code and date predicates are then checked only on those rows.
+        """
+        row_sets = []
+        scans = []
+        for key, value in filters.items():
+            if key in ("date_from", "date_to"):
+                continue
+            col = FILTER_ALIASES.get(key, key)
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            index = self.column_index(col)
+            if index.rows_by_code is not None:
+                row_sets.append(index.rows(values))
+            else:
+                scans.append((index, values))
+
+        candidates = None
+        for rows in sorted(row_sets, key=len):
+            candidates = rows if candidates is None else np.intersect1d(candidates, rows, assume_unique=True)
+
+        if scans:
+            if candidates is None:
+                index, values = scans[0]
+                mask = index.mask(values)
+                for index, values in scans[1:]:
+                    mask &= index.mask(values)
+                candidates = np.flatnonzero(mask)
+            else:
+                for index, values in scans:
+                    candidates = index.contains(candidates, values)
+
+        date_from, date_to = filters.get("date_from"), filters.get("date_to")
+        if date_from is not None or date_to is not None:
+            if candidates is None:
+                candidates = self.date_index().rows(date_from, date_to)
+            else:
+                candidates = self.date_index().contains(candidates, date_from, date_to)
+
+        if candidates is None:
+            candidates = np.arange(len(self.df))
+        return candidates
+
+    def filter(self, filters):
+        """Returns the rows of the dataset matching filters, in their original order."""
+        return self.df.iloc[self.rows(filters)]
@@ -0,0 +1,90 @@
+import logging
+import os
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+WEEKS = 52
+WEEK_COLUMNS = [f"WW{i}_Consumption" for i in range(1, WEEKS + 1)]
+
+# Model name -> forecast function in api.forecast_models
+FORECAST_MODELS = {
+    "xgboost": "forecast_weekly_consumption_xgboost",
+    "arima": "forecast_weekly_consumption_arima",
+}
+
+def normalize_forecast_request(body):
+    """Validates a forecast job submission and fills in defaults, raising ValueError when invalid."""
+    material = body.get("material")
+    if material is None or str(material).strip() == "":
+        raise ValueError("material is required")
+    model = str(body.get("model") or "xgboost").lower()
+    if model not in FORECAST_MODELS:
+        raise ValueError(f"Unknown model: {model}. Supported: {', '.join(FORECAST_MODELS)}")
+    horizon = int(body.get("horizon") or 6)
+    if not 1 <= horizon <= WEEKS:
+        raise ValueError(f"horizon must be between 1 and {WEEKS} weeks")
+    seasonality = body.get("seasonality", "No")
+    if isinstance(seasonality, bool):
+        seasonality = "Yes" if seasonality else "No"
+    seasonality = "Yes" if str(seasonality).lower() in ("yes", "y", "true", "1") else "No"
+    return {"material": str(material), "model": model, "horizon": horizon, "seasonality": seasonality}
+
+def weekly_consumption(df, material):
+    """
+    The 52-week consumption series of one material, as the forecast page builds it.
+
+    Uses the WW{i}_Consumption columns when the data has them; otherwise sums
+    'Quantity' per ISO week of 'Pstng Date' over the year of the material's first
+    transaction.
+
+    Returns:
+        list: 52 floats, week 1 first.
+    """
+    rows = df[df["Material Number"].astype(str) == material]
+    if rows.empty:
+        raise ValueError(f"Material {material} not found in the data")
+
+    if all(col in df.columns for col in WEEK_COLUMNS):
+        values = pd.to_numeric(rows.iloc[0][WEEK_COLUMNS], errors="coerce").fillna(0)
+        return [float(value) for value in values]
+
+    if "Pstng Date" not in df.columns or "Quantity" not in df.columns:
+        raise ValueError("Data needs WW1_Consumption..WW52_Consumption columns or 'Pstng Date' and 'Quantity'")
+    dates = pd.to_datetime(rows["Pstng Date"], errors="coerce")
+    quantities = pd.to_numeric(rows["Quantity"], errors="coerce").astype("float64")
+    valid = dates.notna() & quantities.notna()
+    if not valid.any():
+        raise ValueError(f"No valid transaction data found for material {material}")
+    dates, quantities = dates[valid], quantities[valid]
+    in_year = dates.dt.year == dates.iloc[0].year
+    weeks = dates[in_year].dt.isocalendar().week.astype(int)
+    series = quantities[in_year].groupby(weeks).sum().reindex(range(1, WEEKS + 1), fill_value=0)
+    return [float(value) for value in series]
+
+def run_forecast(material, model, horizon, seasonality, series):
+    """
+    Runs one forecast model on a weekly series. Executed in a job worker process.
+
+    Returns:
+        dict: material, model, horizon, seasonality, the history and the forecast records
+        (week / year / predicted_consumption, as produced by api.forecast_models).
+    """
+    # Forecast functions draw matplotlib figures; never try to open a window in a worker
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    from api import forecast_models
+    import matplotlib.pyplot as plt
+
+    df = pd.DataFrame([[material] + list(series)], columns=["Material Number"] + WEEK_COLUMNS)
+    forecast = getattr(forecast_models, FORECAST_MODELS[model])(df, forecast_weeks_ahead=horizon, seasonality=seasonality)
+    if isinstance(forecast, tuple):
+        forecast = forecast[0]
+    plt.close("all")
+    return {
+        "material": material,
+        "model": model,
+        "horizon": horizon,
+        "seasonality": seasonality,
+        "history": list(series),
+        "forecast": forecast.astype(object).where(forecast.notna(), None).to_dict(orient="records"),
+    }
@@ -1,209 +1,540 @@
-import io, json
 import pandas as pd
 import logging
 import zipfile
-import aiohttp
-from fastapi import FastAPI, UploadFile, File, HTTPException, Response
-from fastapi.responses import StreamingResponse
-from decouple import config
+import os
+import tempfile
+import threading
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Response, Body
+from typing import Optional
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 import asyncio
-import time
+from api.cleaning import GOODS_RECEIPT, MATERIAL_CONSUMPTION, ORDER_PLACEMENT, clean_dataframe
+from api.aggregation import AggregationMemo, aggregate, normalize_query
+from api.datasets import dataset_store
+from api.filter_engine import FilterIndex
+from api.forecast_jobs import normalize_forecast_request, run_forecast, weekly_consumption
+from api.file_formats import UPLOAD_EXTENSIONS, detect_format, iter_csv_chunks, parse_columns_param, read_upload
+from api.jobs import FINISHED_STATES, job_runner
+from api.metrics import PROMETHEUS_MEDIA_TYPE, MetricsMiddleware, record_rows, render_metrics, stage
+from api.parse_cache import parse_cache, read_cleaned_upload
+from api.responses import DataFrameJSONResponse, dataframe_response, dumps_json, join_json_object
+from api.snapshot_store import SNAPSHOT_FOLDER, get_snapshot_store, ingest_snapshot, snapshot_week
+from api.streaming import DEFAULT_CHUNK_SIZE, iter_excel_chunks, ndjson_stream, ndjson_error
+from api.uploads import UPLOAD_SPOOL_DIR, RequestSizeLimitMiddleware, ZipLimitError, spool_upload
+from api.waterfall_analysis import iter_waterfalls_batch, write_waterfall_report
+from api.waterfall_cache import close_http_session, get_http_session, open_http_session, waterfall_cache
+from api.waterfall_query import build_filters, get_index
+from api.workers import cpu_pool
+from api.zip_ingest import parse_zip_members
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-app = FastAPI(docs_url="/api/py/docs", openapi_url="/api/py/openapi.json")
+# Response header carrying the server-side dataset ID of an upload
+DATASET_ID_HEADER = "X-Dataset-Id"
+
+@asynccontextmanager
+async def lifespan(app):
+    # One aiohttp connection pool for all outgoing requests
+    open_http_session()
+    yield
+    await close_http_session()
+    cpu_pool.shutdown()
+    job_runner.shutdown()
+
+app = FastAPI(docs_url="/api/py/docs", openapi_url="/api/py/openapi.json", lifespan=lifespan, default_response_class=DataFrameJSONResponse)
+app.add_middleware(RequestSizeLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/api/py/helloFastApi")
 def hello_fast_api():
     return {"message": "Hello from FastAPI"}
 
 @app.post("/api/py/uploadExcelMaterialConsumption")
-async def upload_file(file: UploadFile):
+async def upload_file(request: Request, file: UploadFile, stream: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE, columns: Optional[str] = None):
+    """
+    Upload a material consumption file (XLSX, CSV or Parquet) and get the cleaned records.
+
+    With ?stream=true the file is read chunk by chunk and returned as
+    newline-delimited JSON (application/x-ndjson), one record per line.
+    Otherwise the Accept header selects JSON (default), Arrow stream or Parquet.
+    ?columns=a,b,c only parses the listed columns.
+    """
+    columns = parse_columns_param(columns)
+    if stream:
+        logger.info("Starting uploadExcelMaterialConsumption endpoint (streaming)")
+
+        # FastAPI closes the request's upload once the handler returns, so the stream reads its own copy
+        workbook = await spool_upload(file)
+        is_csv = detect_format(file.filename, workbook.head) == "csv"
+
+        def stream_records():
+            try:
+                chunks = iter_csv_chunks(workbook.path, columns) if is_csv else iter_excel_chunks(workbook.path, chunk_size)
+                yield from ndjson_stream(chunks, lambda chunk: clean_dataframe(chunk, MATERIAL_CONSUMPTION))
+            except Exception as e:
+                logger.error(f"Error: {e}", exc_info=True)
+                yield ndjson_error("An internal server error occurred. Please check the logs for more details.")
+            finally:
+                workbook.close()
+
+        return StreamingResponse(stream_records(), media_type="application/x-ndjson")
+
     try:
-        logger.info("Starting uploadExcelMaterialConsumption endpoint")
-        contents = await file.read()
-        logger.info("File read successfully")
-        data = pd.read_excel(io.BytesIO(contents))
-        logger.info("Excel file loaded into DataFrame")
-        data = data.applymap(lambda x: x.strip() if isinstance(x, str) else x)
-        data.columns = data.columns.str.strip()
-        logger.info("Stripped leading and trailing spaces from columns and data")
-        data.replace(["", " ", None], "Unknown", inplace=True)
-        logger.info("Replaced empty strings with 'Unknown'")
-        if 'Pstng Date' in data.columns:
-            data['Pstng Date'] = pd.to_datetime(data['Pstng Date'], errors='coerce')
-            logger.info("'Pstng Date' column converted to datetime")
-        if 'SLED/BBD' in data.columns:
-            data['SLED/BBD'] = pd.to_datetime(data['SLED/BBD'], errors='coerce')
-            logger.info("'SLED/BBD' column converted to datetime")
-        if 'Quantity' in data.columns:
-            data['Quantity'] = data['Quantity'].abs()
-            logger.info("Negative values in 'Quantity' converted to positive")
-        if 'Quantity in UnE' in data.columns:
-            data['Quantity in UnE'] = data['Quantity in UnE'].abs()
-            logger.info("Negative values in 'Quantity in UnE' converted to positive")
-        result = data.to_dict(orient="records")
-        logger.info("Data converted to dictionary and returned")
-        return result
+        with stage("receive"):
+            upload = await spool_upload(file)
+        with upload:
+            data = await read_cleaned_upload(upload, "material_consumption", MATERIAL_CONSUMPTION, columns, request=request)
+        dataset_id = dataset_store.register(data, "material_consumption")
+        return await run_in_threadpool(dataframe_response, request, data, {DATASET_ID_HEADER: dataset_id})
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error: {e}", exc_info=True)
         return {"error": "An internal server error occurred. Please check the logs for more details."}
 
 @app.post("/api/py/uploadExcelOrderPlacement")
-async def upload_file(file: UploadFile):
-    contents = await file.read()
-    data = pd.read_excel(io.BytesIO(contents))
-    data = data.applymap(lambda x: x.strip() if isinstance(x, str) else x)
-    data.columns = data.columns.str.strip()
-    data['Order Quantity'] = pd.to_numeric(data['Order Quantity'], errors='coerce')
-    return data.to_dict(orient="records")
+async def upload_file(request: Request, file: UploadFile, columns: Optional[str] = None):
+    with stage("receive"):
+        upload = await spool_upload(file)
+    try:
+        with upload:
+            data = await read_cleaned_upload(upload, "order_placement", ORDER_PLACEMENT, parse_columns_param(columns), request=request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    dataset_id = dataset_store.register(data, "order_placement")
+    return await run_in_threadpool(dataframe_response, request, data, {DATASET_ID_HEADER: dataset_id})
 
 @app.post("/api/py/uploadExcelGoodsReceipt")
-async def upload_file(file: UploadFile):
-    # Read the file contents
-    contents = await file.read()
-    data = pd.read_excel(io.BytesIO(contents))
+async def upload_file(request: Request, file: UploadFile, columns: Optional[str] = None):
+    # Spool the file (XLSX, CSV or Parquet) to disk, within the upload size limits
+    with stage("receive"):
+        upload = await spool_upload(file)
 
-    # Strip leading and trailing spaces from all string columns
-    data = data.applymap(lambda x: x.strip() if isinstance(x, str) else x)
-    data.columns = data.columns.str.strip()
-
-    # Replace empty strings or unexpected values with Unknown
-    data.replace(["", " ", None], "Unknown", inplace=True)
-
-    # Convert 'Pstng Date' to datetime
-    data['Pstng Date'] = pd.to_datetime(data['Pstng Date'], errors='coerce')
-
-    # Convert 'SLED/BBD' to datetime, handling errors
-    data['SLED/BBD'] = pd.to_datetime(data['SLED/BBD'], errors='coerce')
+    # Parse, strip spaces, fill Unknown, convert dates and make quantities positive
+    # (served from the parse cache when the same file was uploaded before)
+    try:
+        with upload:
+            data = await read_cleaned_upload(upload, "goods_receipt", GOODS_RECEIPT, parse_columns_param(columns), request=request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    # Convert negative consumption values to positive
-    if 'Quantity' in data.columns:
-        data['Quantity'] = data['Quantity'].abs()
+    # Keep the cleaned data server-side so filters/charts can reference it by ID
+    dataset_id = dataset_store.register(data, "goods_receipt")
 
-    # Convert to dictionary and return
-    result = data.to_dict(orient="records")
+    # Convert to the negotiated format (JSON records by default) and return
+    result = await run_in_threadpool(dataframe_response, request, data, {DATASET_ID_HEADER: dataset_id})
     return result
 
 
+@app.get("/api/py/metrics")
+def metrics():
+    """Request latency histograms, stage spans, bytes, rows and cache hit rates in the Prometheus text format."""
+    cache_stats = {"parse": parse_cache.stats(), "waterfall": waterfall_cache.stats()}
+    pool_stats = {"cpu": cpu_pool.stats()}
+    return Response(content=render_metrics(cache_stats, pool_stats), media_type=PROMETHEUS_MEDIA_TYPE)
+
+@app.get("/api/py/cache/stats")
+def cache_stats():
+    """Hit/miss counters and memory usage of the upload parse cache."""
+    return parse_cache.stats()
+
+def get_session(dataset_id):
+    session = dataset_store.get(dataset_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired dataset: {dataset_id}")
+    return session
+
+# Filter indexes are built in threadpool threads; this keeps two requests from building the same one
+_filter_index_lock = threading.Lock()
+
+def session_filter_index(session):
+    """Filter index of a registered dataset, built on first use and kept with the session. Blocking."""
+    if "filter_index" not in session.derived:
+        with _filter_index_lock:
+            if "filter_index" not in session.derived:
+                session.derived["filter_index"] = FilterIndex(session.df)
+    return session.derived["filter_index"]
+
+def resolve_dataset(dataset_id, data):
+    """Returns the DataFrame for a registered dataset ID, or builds one from posted rows."""
+    if dataset_id:
+        return get_session(dataset_id).df
+    if data is None:
+        raise HTTPException(status_code=400, detail="Either dataset_id or data must be provided.")
+    return pd.DataFrame(data)
+
+@app.get("/api/py/datasets/{dataset_id}")
+def dataset_info(dataset_id: str):
+    return get_session(dataset_id).info(dataset_store.ttl_seconds)
+
+@app.delete("/api/py/datasets/{dataset_id}")
+def delete_dataset(dataset_id: str):
+    if not dataset_store.remove(dataset_id):
+        raise HTTPException(status_code=404, detail=f"Unknown or expired dataset: {dataset_id}")
+    return {"deleted": dataset_id}
+
+def filter_rows(dataset_id, data, filters):
+    """The blocking part of filter_data: the dataset's filter index (built on first use) applied to filters."""
+    if dataset_id:
+        index = session_filter_index(get_session(dataset_id))
+    else:
+        index = FilterIndex(resolve_dataset(dataset_id, data), columns=[])
+    return index.filter(filters)
+
 @app.post("/api/py/filter/")
-async def filter_data(data: list, filters: dict):
-    df = pd.DataFrame(data)
-    if "plants" in filters:
-        df = df[df["Plant"].isin(filters["plants"])]
-    if "suppliers" in filters:
-        df = df[df["Supplier"].isin(filters["suppliers"])]
-    return df.to_dict(orient="records")
+async def filter_data(request: Request, filters: dict = Body(...), data: Optional[list] = Body(None), dataset_id: Optional[str] = None):
+    """
+    Filters a dataset by any combination of equality, IN-list and date-range predicates.
+
+    filters accepts plants/suppliers/sites/materials/vendors lists, date_from/date_to
+    for 'Pstng Date', and any column name mapped to a value or list of values.
+    Pass ?dataset_id=... (from an upload's X-Dataset-Id header) to filter the
+    server-side copy, whose indexes are kept between calls; posting the rows in
+    "data" is still supported.
+    """
+    try:
+        with stage("filter"):
+            # Building an index and filtering are CPU-bound, keep them off the event loop
+            df = await run_in_threadpool(filter_rows, dataset_id, data, filters)
+        record_rows("filter", len(df))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await run_in_threadpool(dataframe_response, request, df)
 
 @app.post("/api/py/visualization/")
-async def visualization_data(data: list, material_column: str = "Material Number"):
-    df = pd.DataFrame(data)
-    material_counts = df[material_column].value_counts().reset_index()
+async def visualization_data(request: Request, data: Optional[list] = Body(None), material_column: str = "Material Number", dataset_id: Optional[str] = None):
+    df = resolve_dataset(dataset_id, data)
+    materials = df[material_column]
+    if isinstance(materials.dtype, pd.CategoricalDtype):
+        # Compacted datasets: count by first appearance like object columns, so ties keep their order
+        materials = materials.astype(object)
+    material_counts = materials.value_counts().reset_index()
     material_counts.columns = [material_column, "Transaction Count"]
-    return material_counts.to_dict(orient="records")
+    return dataframe_response(request, material_counts)
+
+def aggregate_rows(dataset_id, data, query, filters):
+    """The blocking part of aggregate_data: filters, then aggregates (memoized for registered datasets)."""
+    if dataset_id:
+        session = get_session(dataset_id)
+        memo = session.derived.setdefault("aggregations", AggregationMemo())
+        index = session_filter_index(session)
+        return memo.get_or_compute(query, filters, lambda: aggregate(index.filter(filters) if filters else session.df, query))
+    df = resolve_dataset(dataset_id, data)
+    if filters:
+        df = FilterIndex(df, columns=[]).filter(filters)
+    return aggregate(df, query)
+
+@app.post("/api/py/aggregate/")
+async def aggregate_data(request: Request, query: dict = Body(...), filters: Optional[dict] = Body(None), data: Optional[list] = Body(None), dataset_id: Optional[str] = None):
+    """
+    Server-side group-by aggregation for the dashboard charts.
 
-async def extract_data_from_zip(zip_file: UploadFile):
-    """Extracts data from XLSX files within a ZIP archive and returns a raw json"""
+    query: {"group_by": ["material", "week"], "metrics": ["count", "sum", "mean", "std"],
+            "value_column": "Quantity", "top_k": 10, "sort_by": "sum"}
+    filters: optional filter payload, same format as /api/py/filter/.
+    Results for a registered dataset (?dataset_id=...) are memoized per query and filters.
+    """
+    try:
+        query = normalize_query(query)
+        with stage("aggregate"):
+            # The group-by runs over the whole dataset, keep it off the event loop
+            result = await run_in_threadpool(aggregate_rows, dataset_id, data, query, filters)
+        record_rows("aggregate", len(result))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await run_in_threadpool(dataframe_response, request, result)
+
+async def extract_data_from_zip(archive_path):
+    """Extracts data from XLSX files within a spooled ZIP archive and returns a raw json"""
 
     try:
-        content = await zip_file.read()
-        zip_buffer = io.BytesIO(content)
-
-        with zipfile.ZipFile(zip_buffer, "r") as zip_archive:
-            data = {}
-            for filename in zip_archive.namelist():
-                # log the filename
-                logger.info(f"Processing file: {filename}")
-                print(f"Processing file: {filename}")
-                if filename.endswith(".xlsx"):
-                    try:
-                        excel_file = zip_archive.open(filename)
-                        df = pd.read_excel(excel_file)
-
-                        # Handle NaN values by replacing them with empty strings
-                        df = df.fillna('')
-
-                        data[filename] = df.to_dict(orient="records")  # Convert to list of dictionaries for JSON
-                        # log the current data
-                        logger.info(f"Data extracted from {filename}: {data[filename]}")
-                        print(f"Data extracted from {filename}: {data[filename]}")
-                    except Exception as e:
-                        logger.error(f"Error reading {filename}: {e}", exc_info=True)  # Log the error with traceback
-                        raise HTTPException(status_code=500, detail=f"Error reading {filename}: {e}")  # Abort and return error and message
-
-            return data  # The data dict has the filename and the corresponding json.
+        # Members are parsed concurrently in worker processes; keep the archive order in the result
+        with stage("parse"):
+            results = [result async for result in parse_zip_members(archive_path)]
+        record_rows("parse", sum(result["rows"] for result in results))
+        results.sort(key=lambda result: result["position"])
+        # The data dict has the filename and the corresponding json (records serialized by the workers)
+        return join_json_object({result["filename"]: result["records_json"] for result in results})
     except zipfile.BadZipFile:
         raise HTTPException(status_code=400, detail="Invalid ZIP file")
+    except ZipLimitError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except HTTPException:
+        raise  # e.g. the worker pool is saturated
     except Exception as e:
         logger.error(f"An unexpected error occurred: {str(e)}", exc_info=True)  # Log the unexpected error with traceback
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 
 @app.post("/api/py/uploadShortageZip")
-async def upload_zip(file: UploadFile = File(...)):
-    """Upload a ZIP file containing XLSX files and get the raw data in JSON format."""
+async def upload_zip(file: UploadFile = File(...), stream: bool = False):
+    """
+    Upload a ZIP file containing XLSX files and get the raw data in JSON format.
+
+    With ?stream=true the response is newline-delimited JSON with one
+    {"filename": ..., "records": [...]} line per member, sent as soon as that member is parsed.
+    """
 
     if not file.filename.endswith(".zip"):
         raise HTTPException(status_code=400, detail="Invalid file type. Only ZIP files are allowed.")
 
+    # Declared member sizes are checked against the decompression limits while spooling
+    with stage("receive"):
+        archive = await spool_upload(file, archive_extension=".xlsx")
+
+    if stream:
+        async def stream_members():
+            try:
+                async for result in parse_zip_members(archive.path):
+                    yield join_json_object({"filename": dumps_json(result["filename"]), "records": result["records_json"]}) + b"\n"
+            except zipfile.BadZipFile:
+                yield ndjson_error("Invalid ZIP file")
+            except ZipLimitError as e:
+                yield ndjson_error(str(e))
+            except HTTPException as e:
+                yield ndjson_error(e.detail)
+            except Exception as e:
+                logger.error(f"An unexpected error occurred: {str(e)}", exc_info=True)
+                yield ndjson_error(f"An error occurred: {str(e)}")
+            finally:
+                archive.close()
+
+        return StreamingResponse(stream_members(), media_type="application/x-ndjson")
+
     try:
-        data = await extract_data_from_zip(file)  # Call the function to extract data
+        with archive:
+            data = await extract_data_from_zip(archive.path)  # Call the function to extract data
 
-        return data  #Return the response to the client.
+        return Response(content=data, media_type="application/json")  #Return the response to the client.
     except HTTPException as http_exc:
         raise http_exc  #Re-raise HTTPExceptions to preserve their status codes.
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
 @app.post("/api/py/uploadShortageXlsx")
-async def upload_xlsx(file: UploadFile = File(...)):
-    """Upload an XLSX file and get the raw data in JSON format (optimized)."""
-    if not file.filename.endswith((".xlsx", ".xls")):
-        raise HTTPException(status_code=400, detail="Invalid file type. Only XLSX or XLS files are allowed.")
+async def upload_xlsx(request: Request, file: UploadFile = File(...), columns: Optional[str] = None):
+    """Upload an XLSX, CSV or Parquet shortage file and get the raw data in JSON format (optimized)."""
+    if not file.filename.lower().endswith(UPLOAD_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Invalid file type. Only XLSX, XLS, CSV or Parquet files are allowed.")
 
     try:
-        contents = await file.read()
-        df = pd.read_excel(io.BytesIO(contents))
-        df = df.fillna('')
-
-        # Use Pandas to_json to quickly convert the DataFrame to a JSON string
-        json_data = df.to_json(orient="records")
-        return Response(content=json_data, media_type="application/json")
+        with stage("receive"):
+            upload = await spool_upload(file)
+        with upload, stage("parse"):
+            df = await cpu_pool.run(read_upload, upload.path, file.filename, parse_columns_param(columns), request=request)
+        record_rows("parse", len(df))
+
+        # Empty cells as "" and dates as epoch milliseconds, the shape this endpoint always returned
+        return await run_in_threadpool(DataFrameJSONResponse, df, na_value="", date_format="epoch")
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"An unexpected error occurred: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 @app.get("/api/py/fetchWaterfallJson")
-async def fetch_public_json():
+async def fetch_public_json(request: Request):
     """
-    Streams a JSON file from the public URL using chunked transfer encoding.
-    Logs the download progress every 1 second.
+    Streams the waterfall JSON through a local on-disk cache of the public object.
+
+    The cached copy is revalidated upstream with its ETag (If-None-Match) and served
+    from disk when unchanged; interrupted downloads are resumed with a Range request.
+    A recently validated copy is sent gzip-compressed to clients that accept it.
     """
-    public_url = "https://storage.googleapis.com/babono_bucket/uploadedData.json"
+    headers = {
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+        "Vary": "Accept-Encoding",
+    }
+    if waterfall_cache.is_fresh():
+        waterfall_cache.hits += 1
+        if waterfall_cache.has_gzip() and "gzip" in request.headers.get("accept-encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+            path = waterfall_cache.gzip_path
+        else:
+            headers["Content-Length"] = str(os.path.getsize(waterfall_cache.data_path))
+            path = waterfall_cache.data_path
+        return StreamingResponse(waterfall_cache.iter_file(path), headers=headers, media_type="application/json")
 
     async def stream_content():
         # Yield an initial chunk to trigger the client’s progress update
         yield b" "
+        async for chunk in waterfall_cache.stream(get_http_session()):
+            yield chunk
 
-        total_bytes = 0
-        last_logged = time.time()
+    headers["Transfer-Encoding"] = "chunked"
+    return StreamingResponse(stream_content(), headers=headers, media_type="application/json")
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(public_url) as response:
-                response.raise_for_status()
-                async for chunk in response.content.iter_chunked(8192):
-                    total_bytes += len(chunk)
-                    current_time = time.time()
-                    if current_time - last_logged >= 1:
-                        logger.info(f"Downloaded {total_bytes} bytes so far")
-                        last_logged = current_time
-                    yield chunk
+@app.get("/api/py/waterfall/records")
+async def query_waterfall(
+    material: Optional[str] = None,
+    plant: Optional[str] = None,
+    site: Optional[str] = None,
+    week: Optional[str] = None,
+    measures: Optional[str] = None,
+    start_week: Optional[str] = None,
+    num_weeks: int = 12,
+):
+    """
+    Returns only the waterfall records matching the filters, instead of the whole document.
 
-    headers = {
-        "Cache-Control": "no-cache",
-        "X-Accel-Buffering": "no",
-        "Transfer-Encoding": "chunked"
-    }
-    return StreamingResponse(stream_content(), headers=headers, media_type="application/json")
+    Each filter is a comma-separated list (e.g. ?material=M1&plant=P1&site=S1&week=WW05,WW06);
+    ?start_week=WW20&num_weeks=12 selects the dashboard's window of snapshots. Records get
+    their "Snapshot" week. The cached JSON is parsed incrementally once to build a side
+    index of record byte ranges; queries then read just the matching records.
+    """
+    try:
+        filters = build_filters(material, plant, site, week, measures, start_week, num_weeks)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not waterfall_cache.is_fresh():
+        try:
+            await waterfall_cache.ensure_cached(get_http_session())
+        except Exception as e:
+            logger.error(f"Error refreshing the waterfall JSON: {e}", exc_info=True)
+            if not waterfall_cache.is_cached():
+                raise HTTPException(status_code=502, detail="Waterfall data is unavailable")
+
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: get_index(waterfall_cache.data_path).query(filters))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/py/waterfallCache/stats")
+def waterfall_cache_stats():
+    """Hit / revalidation / download counters of the waterfall JSON cache."""
+    return waterfall_cache.stats()
+
+@app.post("/api/py/snapshots/ingest")
+async def ingest_weekly_snapshot(file: UploadFile = File(...), week: Optional[int] = None):
+    """
+    Adds or replaces one weekly shortage snapshot (WW{n}.xlsx) in the waterfall snapshot store.
+
+    Only the uploaded workbook is converted. Cached waterfall, alert and chart results are
+    dropped only for the changed week and, when a week is replaced, the changed materials.
+    ?week=n stores the upload as WW{n}.xlsx; otherwise its file name is used.
+    """
+    if not SNAPSHOT_FOLDER:
+        raise HTTPException(status_code=503, detail="SNAPSHOT_FOLDER is not configured.")
+    filename = f"WW{week}.xlsx" if week else os.path.basename(file.filename or "")
+    if snapshot_week(filename) is None:
+        raise HTTPException(status_code=400, detail="Snapshot files must be named WW<week>.xlsx, or pass ?week=<n>.")
+
+    with stage("receive"):
+        upload = await spool_upload(file)
+    with upload, stage("ingest"):
+        try:
+            return await run_in_threadpool(ingest_snapshot, upload.path, filename)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/py/snapshots")
+def snapshot_store_status():
+    """Weeks in the snapshot store, its recent changes and the counters of its cached results."""
+    if not SNAPSHOT_FOLDER:
+        raise HTTPException(status_code=503, detail="SNAPSHOT_FOLDER is not configured.")
+    return get_snapshot_store(SNAPSHOT_FOLDER).summary()
+
+def build_waterfall_report(path, start_week, num_weeks, materials):
+    # Waterfalls are extracted a chunk of materials at a time and written as they come
+    if not write_waterfall_report(path, iter_waterfalls_batch(SNAPSHOT_FOLDER, start_week, num_weeks, materials)):
+        raise ValueError("No matching data found in the snapshot store.")
+
+@app.get("/api/py/snapshots/report")
+async def waterfall_report(start_week: int, num_weeks: int = 12, materials: Optional[str] = None):
+    """
+    Downloads the waterfalls of the snapshot store as one colored XLSX workbook,
+    one sheet per (material, plant, site). ?materials=a,b limits it to those materials.
+    """
+    if not SNAPSHOT_FOLDER:
+        raise HTTPException(status_code=503, detail="SNAPSHOT_FOLDER is not configured.")
+    materials = parse_columns_param(materials)
+    fd, path = tempfile.mkstemp(prefix="waterfall-", suffix=".xlsx", dir=UPLOAD_SPOOL_DIR)
+    os.close(fd)
+    try:
+        with stage("report"):
+            await run_in_threadpool(build_waterfall_report, path, start_week, num_weeks, materials)
+    except ValueError as e:
+        os.remove(path)
+        raise HTTPException(status_code=404, detail=str(e))
+    except BaseException:
+        os.remove(path)
+        raise
+    return FileResponse(
+        path,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        filename=f"waterfall_WW{start_week:02d}.xlsx",
+        background=BackgroundTask(os.remove, path),
+    )
+
+# Seconds between progress lines of a streamed job
+JOB_STREAM_INTERVAL = 1.0
+
+@app.post("/api/py/jobs/forecast")
+async def submit_forecast_job(body: dict = Body(...), dataset_id: Optional[str] = None):
+    """
+    Queues a consumption forecast and returns its job ID right away.
+
+    body: {"material": "M1", "model": "xgboost" | "arima", "horizon": 6, "seasonality": "Yes" | "No",
+           "data": [...rows]} - or pass ?dataset_id=... instead of "data". Rows are either
+    transactions ('Pstng Date', 'Quantity') or a WW1_Consumption..WW52_Consumption table.
+    Identical submissions return the existing job (deduplicated: true).
+    """
+    try:
+        params = normalize_forecast_request(body)
+        df = resolve_dataset(dataset_id, body.get("data"))
+        series = await run_in_threadpool(weekly_consumption, df, params["material"])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    args = (params["material"], params["model"], params["horizon"], params["seasonality"], series)
+    job_id, deduplicated = job_runner.submit("forecast", run_forecast, args, params, payload=series)
+    return {"job_id": job_id, "deduplicated": deduplicated, **job_runner.status(job_id)}
+
+@app.get("/api/py/jobs/{job_id}")
+def job_status(job_id: str):
+    """Status of a background job (queued, running, succeeded, failed, cancelled), with its result once done."""
+    status = job_runner.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired.")
+    return status
+
+@app.get("/api/py/jobs/{job_id}/stream")
+async def stream_job(job_id: str):
+    """
+    Streams a job's progress as newline-delimited JSON: one status line per second
+    (status, elapsed) until it finishes, then a last line with the result or error.
+    """
+    if job_runner.status(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired.")
+
+    async def progress():
+        while True:
+            status = job_runner.status(job_id)
+            if status is None:
+                yield ndjson_error("Job expired")
+                return
+            yield dumps_json(status) + b"\n"
+            if status["status"] in FINISHED_STATES:
+                return
+            await asyncio.sleep(JOB_STREAM_INTERVAL)
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
+
+@app.delete("/api/py/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Cancels a job that is still queued."""
+    if job_runner.status(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired.")
+    if not job_runner.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job is already running or finished.")
+    return {"cancelled": job_id}
@@ -0,0 +1,259 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from decouple import config
+from fastapi import HTTPException
+from api.responses import dumps_json
+
+logger = logging.getLogger(__name__)
+
+# Worker processes running background jobs (forecasts), separate from the request CPU pool
+JOB_WORKERS = config("JOB_WORKERS", default=2, cast=int)
+# Queued + running jobs accepted before new submissions are rejected
+JOB_QUEUE_SIZE = config("JOB_QUEUE_SIZE", default=100, cast=int)
+# Finished jobs (and their results) are kept this long
+JOB_TTL_SECONDS = config("JOB_TTL_SECONDS", default=3600, cast=int)
+# ":memory:" keeps jobs in-process; a file path persists them across restarts
+JOB_DB_PATH = config("JOB_DB_PATH", default=":memory:")
+JOB_RETRY_AFTER_SECONDS = config("JOB_RETRY_AFTER_SECONDS", default=30, cast=int)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    dedup_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, status);
+"""
+
+def dedup_key(kind, params, payload=None):
+    """Identical submissions (same kind, parameters and input data) share one key."""
+    text = json.dumps([kind, params, payload], sort_keys=True, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _run_job(func, args):
+    """Runs a job in a worker process; exceptions come back as text since they may not pickle."""
+    started = time.time()
+    try:
+        return {"ok": True, "result": func(*args), "started_at": started}
+    except Exception as e:
+        return {"ok": False, "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc(), "started_at": started}
+
+class JobStore:
+    """
+    SQLite table of background jobs: status, parameters, result and timestamps.
+
+    In-memory by default; with JOB_DB_PATH set to a file, finished results survive
+    a restart and jobs interrupted by it are marked failed.
+    """
+
+    def __init__(self, path=JOB_DB_PATH, ttl_seconds=JOB_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(SCHEMA)
+        self._db.execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ?, expires_at = ? WHERE status IN (?, ?)",
+            (FAILED, "Interrupted by a server restart", time.time(), time.time() + ttl_seconds, QUEUED, RUNNING),
+        )
+
+    def _purge_expired(self):
+        deleted = self._db.execute("DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),)).rowcount
+        if deleted:
+            logger.info(f"Purged {deleted} expired job(s)")
+
+    def find_active(self, key):
+        """The most recent job with this dedup key that is pending or succeeded (and not expired)."""
+        with self._lock:
+            self._purge_expired()
+            row = self._db.execute(
+                "SELECT * FROM jobs WHERE dedup_key = ? AND status IN (?, ?, ?) ORDER BY created_at DESC LIMIT 1",
+                (key, QUEUED, RUNNING, SUCCEEDED),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def create(self, kind, key, params):
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, dedup_key, status, params, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, key, QUEUED, json.dumps(params, default=str), time.time()),
+            )
+        return job_id
+
+    def update(self, job_id, **fields):
+        if fields.get("status") in FINISHED_STATES:
+            fields.setdefault("finished_at", time.time())
+            fields["expires_at"] = fields["finished_at"] + self.ttl_seconds
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        with self._lock:
+            self._purge_expired()
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def count_pending(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)).fetchone()[0]
+
+class JobRunner:
+    """
+    Runs submitted jobs in a local process pool and records their outcome in a JobStore.
+
+    Jobs wait in the runner's own queue and are handed to the pool only when a worker
+    is free, so a job in the pool is really running (its started_at is when it was
+    handed over, then the worker's own start time) and a queued job can still be cancelled.
+
+    Identical submissions are deduplicated: while a matching job is queued, running
+    or its result is retained, its ID is returned instead of starting a new one.
+    """
+
+    def __init__(self, store, max_workers=JOB_WORKERS, queue_size=JOB_QUEUE_SIZE):
+        self.store = store
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self._executor = None
+        self._pending = deque()  # (job ID, func, args) waiting for a free worker
+        self._futures = {}  # job ID -> future of the jobs handed to the pool
+        # Reentrant: a job that finishes at once runs its done callback inside _dispatch
+        self._lock = threading.RLock()
+
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            self._pending.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, kind, func, args, params, payload=None):
+        """
+        Queues func(*args) as a job of the given kind.
+
+        Args:
+            kind (str): Job type, e.g. "forecast".
+            func: Picklable, module-level function run in a worker process.
+            args (tuple): Picklable arguments of func.
+            params (dict): Parameters shown with the job and part of the dedup key.
+            payload: Input data fingerprinted into the dedup key (not stored).
+
+        Returns:
+            tuple: (job ID, True when an identical job already existed).
+        """
+        key = dedup_key(kind, params, payload)
+        with self._lock:
+            existing = self.store.find_active(key)
+            if existing is not None:
+                logger.info(f"Deduplicated {kind} job submission onto {existing['id']}")
+                return existing["id"], True
+
+            if self.store.count_pending() >= self.queue_size:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Too many background jobs are pending. Please retry later.",
+                    headers={"Retry-After": str(JOB_RETRY_AFTER_SECONDS)},
+                )
+
+            job_id = self.store.create(kind, key, params)
+            self._pending.append((job_id, func, args))
+            logger.info(f"Queued {kind} job {job_id}")
+            self._dispatch()
+        return job_id, False
+
+    def _dispatch(self):
+        """Hands queued jobs to the pool while a worker is free. Called with the lock held."""
+        while self._pending and len(self._futures) < max(self.max_workers, 1):
+            job_id, func, args = self._pending.popleft()
+            self.store.update(job_id, status=RUNNING, started_at=time.time())
+            future = self.executor().submit(_run_job, func, args)
+            self._futures[job_id] = future
+            future.add_done_callback(lambda future, job_id=job_id: self._finish(job_id, future))
+
+    def _finish(self, job_id, future):
+        with self._lock:
+            self._futures.pop(job_id, None)
+            self._dispatch()
+        if future.cancelled():
+            self.store.update(job_id, status=CANCELLED)
+            return
+        try:
+            outcome = future.result()
+        except Exception as e:  # e.g. a worker process died
+            outcome = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        # The worker's own start time when it reported one, else the time of the hand-over
+        started = {"started_at": outcome["started_at"]} if outcome.get("started_at") else {}
+        if outcome["ok"]:
+            self.store.update(job_id, status=SUCCEEDED, result=dumps_json(outcome["result"]).decode("utf-8"), **started)
+            logger.info(f"Job {job_id} succeeded")
+        else:
+            self.store.update(job_id, status=FAILED, error=outcome["error"], **started)
+            logger.error(f"Job {job_id} failed: {outcome['error']}\n{outcome.get('traceback', '')}")
+
+    def cancel(self, job_id):
+        """Cancels a job that has not started yet; returns False when it is already running or done."""
+        with self._lock:
+            for position, (pending_id, _, _) in enumerate(self._pending):
+                if pending_id == job_id:
+                    del self._pending[position]
+                    break
+            else:
+                return False
+        self.store.update(job_id, status=CANCELLED)
+        logger.info(f"Cancelled queued job {job_id}")
+        return True
+
+    def status(self, job_id):
+        """
+        The job's state as returned by the API, or None when unknown or expired.
+
+        The result is included once the job has succeeded.
+        """
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        status = job["status"]
+        now = time.time()
+        info = {
+            "job_id": job["id"],
+            "kind": job["kind"],
+            "status": status,
+            "params": json.loads(job["params"]),
+            "created_at": job["created_at"],
+            # Time spent running (0 while queued), not counting the wait for a worker
+            "elapsed": round((job["finished_at"] or now) - job["started_at"], 3) if job["started_at"] else 0.0,
+        }
+        if job["expires_at"] is not None:
+            info["expires_in"] = max(0, int(job["expires_at"] - now))
+        if status == SUCCEEDED:
+            info["result"] = json.loads(job["result"])
+        if status == FAILED:
+            info["error"] = job["error"]
+        return info
+
+job_runner = JobRunner(JobStore())
@@ -0,0 +1,211 @@
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _label_text(labels):
+    labels = list(labels)
+    if not labels:
+        return ""
+    escape = lambda value: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
+
+class Counter:
+    """Monotonic counter per label set."""
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(zip(self.label_names, key))} {value}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, as in the Prometheus text format."""
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                labels = list(zip(self.label_names, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_label_text(labels + [('le', bound)])} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(labels)} {total}")
+                lines.append(f"{self.name}_count{_label_text(labels)} {cumulative}")
+        return lines
+
+REQUESTS = Counter("capstone_requests_total", "Requests handled, by route, method and status.", ("route", "method", "status"))
+REQUEST_DURATION = Histogram("capstone_request_duration_seconds", "End-to-end request latency, by route.", ("route", "method"))
+STAGE_DURATION = Histogram("capstone_stage_duration_seconds", "Time spent in a processing stage, by route.", ("route", "stage"))
+REQUEST_BYTES = Counter("capstone_request_bytes_total", "Request body bytes received, by route.", ("route",))
+RESPONSE_BYTES = Counter("capstone_response_bytes_total", "Response body bytes sent, by route.", ("route",))
+ROWS = Counter("capstone_rows_total", "Rows produced by a processing stage, by route.", ("route", "stage"))
+
+METRICS = [REQUESTS, REQUEST_DURATION, STAGE_DURATION, REQUEST_BYTES, RESPONSE_BYTES, ROWS]
+
+class RequestMetrics:
+    """Stage timings and row counts of the request being handled."""
+
+    def __init__(self, method):
+        self.method = method
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.rows = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+@contextmanager
+def stage(name):
+    """
+    Times a processing stage (receive, parse, clean, serialize, ...) of the current request.
+
+    A no-op outside of a request, e.g. in worker threads or processes.
+    """
+    metrics = _current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.stages[name] = metrics.stages.get(name, 0.0) + time.perf_counter() - started
+
+def record_stage(name, seconds):
+    """Adds a stage duration measured elsewhere (e.g. inside a worker process) to the current request."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.stages[name] = metrics.stages.get(name, 0.0) + seconds
+
+def record_rows(stage_name, rows):
+    """Counts the rows a stage produced for the current request."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.rows[stage_name] = metrics.rows.get(stage_name, 0) + rows
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, body sizes, stage spans and row counts per route.
+
+    Routes are labelled by their path template (e.g. /api/py/datasets/{dataset_id}),
+    so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = RequestMetrics(scope["method"])
+        token = _current.set(metrics)
+        status = {"code": 500}
+
+        async def receive_counted():
+            message = await receive()
+            if message["type"] == "http.request":
+                metrics.bytes_in += len(message.get("body", b""))
+            return message
+
+        async def send_counted(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            elif message["type"] == "http.response.body":
+                metrics.bytes_out += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_counted, send_counted)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            self.record(metrics, route.path if route is not None else "unmatched", status["code"])
+
+    @staticmethod
+    def record(metrics, route, status):
+        duration = time.perf_counter() - metrics.started
+        REQUESTS.inc(route=route, method=metrics.method, status=status)
+        REQUEST_DURATION.observe(duration, route=route, method=metrics.method)
+        REQUEST_BYTES.inc(metrics.bytes_in, route=route)
+        RESPONSE_BYTES.inc(metrics.bytes_out, route=route)
+        for name, seconds in metrics.stages.items():
+            STAGE_DURATION.observe(seconds, route=route, stage=name)
+        for name, rows in metrics.rows.items():
+            ROWS.inc(rows, route=route, stage=name)
+        if metrics.rows:
+            stages = " ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in metrics.stages.items())
+            rows = " ".join(f"{name}={count}" for name, count in metrics.rows.items())
+            logger.info(
+                f"{metrics.method} {route} {status} in {duration * 1000:.1f}ms "
+                f"stages[{stages}] rows[{rows}] bytes_in={metrics.bytes_in} bytes_out={metrics.bytes_out}"
+            )
+
+def _stats_gauges(prefix, label, groups):
+    """Exports the numeric values of stats dicts as gauges, e.g. capstone_cache_hits{cache="parse"}."""
+    gauges = {}
+    for group_name, stats in (groups or {}).items():
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                gauges.setdefault(key, []).append((group_name, value))
+    lines = []
+    for key, values in gauges.items():
+        name = f"{prefix}_{key}"
+        lines += [f"# HELP {name} Statistic '{key}' by {label}.", f"# TYPE {name} gauge"]
+        lines += [f"{name}{_label_text([(label, group_name)])} {value}" for group_name, value in values]
+    return lines
+
+def render_metrics(cache_stats=None, pool_stats=None):
+    """
+    Renders all metrics in the Prometheus text exposition format.
+
+    Args:
+        cache_stats (dict): Cache name -> stats dict, exported as capstone_cache_<stat>{cache="<name>"}
+            gauges (hits, misses, hit_rate, ...).
+        pool_stats (dict): Pool name -> stats dict, exported as capstone_pool_<stat>{pool="<name>"}.
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.expose())
+    lines += _stats_gauges("capstone_cache", "cache", cache_stats)
+    lines += _stats_gauges("capstone_pool", "pool", pool_stats)
+    return "\n".join(lines) + "\n"
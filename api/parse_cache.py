@@ -0,0 +1,239 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+import pyarrow as pa
+import pyarrow.parquet as pq
+from decouple import config
+from starlette.concurrency import run_in_threadpool
+from api.cleaning import CLEANING_VERSION, clean_dataframe, compact_dataframe
+from api.file_formats import read_upload
+from api.metrics import record_rows, record_stage
+from api.workers import cpu_pool
+
+logger = logging.getLogger(__name__)
+
+PARSE_CACHE_MAX_MB = config("PARSE_CACHE_MAX_MB", default=256, cast=int)
+PARSE_CACHE_DIR = config("PARSE_CACHE_DIR", default=os.path.join(tempfile.gettempdir(), "capstone_parse_cache"))
+# Disk space of the spilled entries; the least recently used files are deleted above it
+PARSE_CACHE_SPILL_MAX_MB = config("PARSE_CACHE_SPILL_MAX_MB", default=1024, cast=int)
+# Store cleaned uploads with categorical / downcast dtypes (see api.cleaning.compact_dataframe)
+COMPACT_DATASETS = config("COMPACT_DATASETS", default=True, cast=bool)
+
+class ParseCache:
+    """
+    Content-addressed cache of parsed and cleaned upload DataFrames.
+
+    Entries are keyed by the SHA-256 of the uploaded file plus the endpoint and
+    CLEANING_VERSION, held in a memory-bounded LRU and spilled to Parquet files
+    in spill_dir when evicted. Cached DataFrames are shared, so callers must not
+    modify them in place.
+
+    The spill directory is an LRU too: files beyond max_spill_bytes are deleted
+    oldest-used first, and files of another CLEANING_VERSION are deleted on start.
+    """
+
+    def __init__(self, max_bytes, spill_dir=None, max_spill_bytes=None):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self._entries = OrderedDict()  # key -> (DataFrame, size in bytes)
+        self._size = 0
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.spill_deletions = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self._prune_spill_dir(drop_stale=True)
+
+    @staticmethod
+    def make_key(digest, endpoint):
+        """Cache key of an upload from its SHA-256 hex digest (see api.uploads.SpooledUpload)."""
+        return f"{endpoint}-v{CLEANING_VERSION}-{digest}"
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, f"{key}.parquet")
+
+    def get(self, key):
+        """Returns the cached DataFrame for key, or None on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+
+        if self.spill_dir and os.path.exists(self._spill_path(key)):
+            try:
+                df = pq.read_table(self._spill_path(key)).to_pandas()
+                os.utime(self._spill_path(key))  # the mtime orders the spill directory's LRU
+            except Exception as e:
+                logger.warning(f"Could not read spilled cache entry {key}: {e}")
+            else:
+                with self._lock:
+                    self.disk_hits += 1
+                self.put(key, df)
+                return df
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, df):
+        """Stores df under key, evicting (and spilling) least recently used entries over the limit."""
+        size = int(df.memory_usage(deep=True).sum())
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            self._entries[key] = (df, size)
+            self._size += size
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                old_key, (old_df, old_size) = self._entries.popitem(last=False)
+                self._size -= old_size
+                self.evictions += 1
+                evicted.append((old_key, old_df))
+
+        for old_key, old_df in evicted:
+            self._spill(old_key, old_df)
+
+    def _spill(self, key, df):
+        if not self.spill_dir or os.path.exists(self._spill_path(key)):
+            return
+        try:
+            # No string fallback here: a disk hit must give back exactly the cleaned values
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            logger.info(f"Not spilling cache entry {key}, columns are not Arrow-typed: {e}")
+            return
+        tmp_path = self._spill_path(key) + ".tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, self._spill_path(key))
+        logger.info(f"Spilled cache entry {key} to disk")
+        self._prune_spill_dir()
+
+    def _spill_files(self):
+        """(mtime, size, path, name) of the files in spill_dir, oldest first."""
+        files = []
+        for entry in os.scandir(self.spill_dir):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if entry.is_file():
+                files.append((stat.st_mtime, stat.st_size, entry.path, entry.name))
+        return sorted(files)
+
+    def _prune_spill_dir(self, drop_stale=False):
+        """
+        Deletes spilled entries over max_spill_bytes, least recently used first.
+
+        Args:
+            drop_stale (bool): Also delete entries written by another CLEANING_VERSION and
+                leftover .tmp files of interrupted spills (done once, when the cache starts).
+        """
+        current = re.compile(rf".+-v{CLEANING_VERSION}-[0-9a-f]{{64}}\.parquet")
+        kept = []
+        deleted = 0
+        with self._spill_lock:
+            for _, size, path, name in self._spill_files():
+                if drop_stale and not current.fullmatch(name):
+                    deleted += self._delete_spill(path)
+                elif name.endswith(".parquet"):
+                    kept.append((size, path))
+            total = sum(size for size, _ in kept)
+            for size, path in kept:
+                if self.max_spill_bytes is None or total <= self.max_spill_bytes:
+                    break
+                total -= size
+                deleted += self._delete_spill(path)
+        if deleted:
+            with self._lock:
+                self.spill_deletions += deleted
+            logger.info(f"Deleted {deleted} spilled cache file(s) from {self.spill_dir}")
+
+    @staticmethod
+    def _delete_spill(path):
+        try:
+            os.remove(path)
+        except OSError:
+            return 0
+        return 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "memory_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "spill_deletions": self.spill_deletions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+parse_cache = ParseCache(PARSE_CACHE_MAX_MB * 1024 * 1024, PARSE_CACHE_DIR, PARSE_CACHE_SPILL_MAX_MB * 1024 * 1024)
+
+def parse_and_clean(path, filename, spec, columns=None):
+    """
+    Parses, cleans and compacts a spooled upload. Runs in a worker process of api.workers.cpu_pool.
+
+    Returns:
+        tuple: (cleaned DataFrame, parsed row count, {"parse": seconds, "clean": seconds, "compact": seconds}).
+    """
+    started = time.perf_counter()
+    data = read_upload(path, filename, columns)
+    parsed = time.perf_counter()
+    parsed_rows = len(data)
+    data = clean_dataframe(data, spec)
+    cleaned = time.perf_counter()
+    timings = {"parse": parsed - started, "clean": cleaned - parsed}
+    if COMPACT_DATASETS:
+        data = compact_dataframe(data)
+        timings["compact"] = time.perf_counter() - cleaned
+    return data, parsed_rows, timings
+
+async def read_cleaned_upload(upload, endpoint, spec, columns=None, request=None):
+    """
+    Parses (Excel, CSV or Parquet) and cleans an upload, reusing the cached result for identical files.
+
+    The upload's digest was computed while spooling it, so a cache hit costs no extra
+    pass over the file. Parsing and cleaning run in the CPU worker pool, which opens
+    the spooled file by path, so the event loop stays free while large files are processed.
+
+    Args:
+        upload (SpooledUpload): The spooled upload (api.uploads.spool_upload).
+        endpoint (str): Name of the calling endpoint, part of the cache key.
+        spec (dict): Cleaning spec from api.cleaning.
+        columns (list): Optional column projection, part of the cache key.
+        request (Request): The work is abandoned when this request's client disconnects.
+
+    Returns:
+        pandas.DataFrame: The cleaned DataFrame (shared with the cache, do not modify in place).
+    """
+    cache_scope = endpoint if not columns else f"{endpoint}-cols-{hashlib.sha1(repr(columns).encode()).hexdigest()[:12]}"
+    if not COMPACT_DATASETS:
+        cache_scope += "-full"
+    key = ParseCache.make_key(upload.digest, cache_scope)
+    data = await run_in_threadpool(parse_cache.get, key)
+    if data is not None:
+        logger.info(f"Parse cache hit for {endpoint}")
+        return data
+
+    data, parsed_rows, timings = await cpu_pool.run(parse_and_clean, upload.path, upload.filename, spec, columns, request=request)
+    for name, seconds in timings.items():
+        record_stage(name, seconds)
+    record_rows("parse", parsed_rows)
+    record_rows("clean", len(data))
+    await run_in_threadpool(parse_cache.put, key, data)
+    return data
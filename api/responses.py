@@ -0,0 +1,194 @@
+import datetime
+import io
+import json
+import logging
+from itertools import repeat
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from api.metrics import record_rows, stage
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPES = ("application/vnd.apache.parquet", "application/x-parquet")
+
+def _accepted_media_types(request):
+    """Parses the Accept header into media types ordered by their q-value."""
+    accepted = []
+    for position, part in enumerate(request.headers.get("accept", "").split(",")):
+        fields = [field.strip() for field in part.split(";")]
+        if not fields[0]:
+            continue
+        quality = 1.0
+        for param in fields[1:]:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.append((-quality, position, fields[0].lower()))
+    return [media_type for _, _, media_type in sorted(accepted)]
+
+def negotiate_format(request):
+    """Returns 'arrow', 'parquet' or 'json' for the request's Accept header (JSON by default)."""
+    for media_type in _accepted_media_types(request):
+        if media_type == ARROW_STREAM_MEDIA_TYPE:
+            return "arrow"
+        if media_type in PARQUET_MEDIA_TYPES:
+            return "parquet"
+        if media_type in ("application/json", "*/*", "application/*"):
+            return "json"
+    return "json"
+
+def dataframe_to_arrow(df):
+    """
+    Converts a DataFrame to a pyarrow Table.
+
+    Cleaned uploads can hold mixed object columns (e.g. numbers plus "Unknown"), which
+    Arrow cannot type; those columns are sent as strings instead.
+    """
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        df = df.copy(deep=False)
+        for col in df.columns:
+            if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True) != "string":
+                df[col] = df[col].astype(str).where(df[col].notna(), None)
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+def arrow_stream_bytes(df):
+    table = dataframe_to_arrow(df)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def parquet_bytes(df):
+    buffer = io.BytesIO()
+    pq.write_table(dataframe_to_arrow(df), buffer)
+    return buffer.getvalue()
+
+def _epoch_millis(value):
+    return int(pd.Timestamp(value).value // 1_000_000)
+
+def _json_default(value, date_format="iso"):
+    """Encodes what the fast path leaves behind in object columns (Timestamps, numpy scalars, ...)."""
+    if isinstance(value, datetime.datetime):
+        return _epoch_millis(value) if date_format == "epoch" else value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return jsonable_encoder(value)
+
+def _column_values(series, na_value, date_format):
+    """Converts one column to a list of JSON-native values, working on the whole column at once."""
+    missing = series.isna().to_numpy()
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        if date_format == "epoch":
+            values = (series.to_numpy(dtype="datetime64[ns]").astype("int64") // 1_000_000).astype(object)
+        else:
+            values = np.asarray(series.array.to_pydatetime(), dtype=object)
+    elif pd.api.types.is_bool_dtype(series.dtype) or pd.api.types.is_integer_dtype(series.dtype):
+        if not missing.any():
+            return series.tolist()
+        values = series.to_numpy(dtype=object)
+    elif pd.api.types.is_float_dtype(series.dtype):
+        values = series.to_numpy(dtype=float).astype(object)
+    else:
+        values = series.to_numpy(dtype=object, copy=True)
+    if missing.any():
+        values[missing] = na_value
+    return values.tolist()
+
+def dataframe_records(df, na_value=None, date_format="iso"):
+    """
+    Converts a DataFrame to JSON-ready records, column by column.
+
+    Args:
+        df (pandas.DataFrame): Data to convert.
+        na_value: Value used for NaN / NaT / None (null by default, "" for the raw shortage data).
+        date_format (str): "iso" (isoformat strings, as jsonable_encoder) or "epoch" (milliseconds, as to_json).
+
+    Returns:
+        list: One dict per row.
+    """
+    names = [str(col) for col in df.columns]
+    columns = [_column_values(df.iloc[:, i], na_value, date_format) for i in range(df.shape[1])]
+    if not columns:
+        return [{} for _ in range(len(df))]
+    return list(map(dict, map(zip, repeat(names), zip(*columns))))
+
+def dumps_json(content, date_format="iso"):
+    """Serializes content to JSON bytes, with orjson when it is installed."""
+    default = lambda value: _json_default(value, date_format)
+    if HAS_ORJSON:
+        return orjson.dumps(content, default=default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=default, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def dataframe_json_bytes(df, na_value=None, date_format="iso"):
+    """A DataFrame as a JSON array of records."""
+    return dumps_json(dataframe_records(df, na_value, date_format), date_format)
+
+def dataframe_json_lines(df, na_value=None, date_format="iso"):
+    """A DataFrame as newline-delimited JSON records (with a trailing newline)."""
+    return b"".join(dumps_json(record, date_format) + b"\n" for record in dataframe_records(df, na_value, date_format))
+
+def join_json_object(fragments):
+    """Builds a JSON object from already serialized values, given as {key: JSON bytes}."""
+    members = [dumps_json(str(key)) + b":" + value for key, value in fragments.items()]
+    return b"{" + b",".join(members) + b"}"
+
+class DataFrameJSONResponse(JSONResponse):
+    """
+    JSON response serialized with orjson when available (the json module otherwise).
+
+    DataFrames are rendered as records straight from their columns, NaN / NaT as
+    na_value and datetimes in date_format; any other content is rendered like
+    JSONResponse, with numpy scalars and datetimes supported. Used as the app's
+    default response class.
+    """
+
+    def __init__(self, content, na_value=None, date_format="iso", **kwargs):
+        self.na_value = na_value
+        self.date_format = date_format
+        super().__init__(content, **kwargs)
+
+    def render(self, content):
+        with stage("serialize"):
+            if isinstance(content, pd.DataFrame):
+                record_rows("serialize", len(content))
+                return dataframe_json_bytes(content, self.na_value, self.date_format)
+            return dumps_json(content, self.date_format)
+
+def dataframe_response(request, df, headers=None):
+    """
+    Returns a DataFrame in the format the client asked for.
+
+    JSON records stay the default; clients sending
+    Accept: application/vnd.apache.arrow.stream or application/vnd.apache.parquet
+    get the same columns as a columnar binary payload. headers are added to any format.
+    """
+    response_format = negotiate_format(request)
+    if response_format == "arrow":
+        record_rows("serialize", len(df))
+        with stage("serialize"):
+            return Response(content=arrow_stream_bytes(df), media_type=ARROW_STREAM_MEDIA_TYPE, headers=headers)
+    if response_format == "parquet":
+        record_rows("serialize", len(df))
+        with stage("serialize"):
+            return Response(content=parquet_bytes(df), media_type=PARQUET_MEDIA_TYPES[0], headers=headers)
+    # NaN / NaT are not valid JSON, they are sent as null
+    return DataFrameJSONResponse(df, headers=headers)
@@ -0,0 +1,619 @@
+import argparse
+import copy
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from decouple import config
+from openpyxl import load_workbook
+from api.excel_reader import read_excel
+from api.waterfall_query import file_fingerprint, key_text
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_STORE_DIR = config("SNAPSHOT_STORE_DIR", default=os.path.join(tempfile.gettempdir(), "capstone_snapshots"))
+# Rows per Parquet row group; smaller groups let a lookup skip more of the file
+SNAPSHOT_ROW_GROUP_ROWS = config("SNAPSHOT_ROW_GROUP_ROWS", default=4096, cast=int)
+# Worker processes converting changed workbooks in parallel; 0 converts them one by one in-process
+SNAPSHOT_WORKERS = config("SNAPSHOT_WORKERS", default=min(4, os.cpu_count() or 1), cast=int)
+# Threads reading the weekly Parquet files of one query concurrently
+SNAPSHOT_READ_THREADS = config("SNAPSHOT_READ_THREADS", default=8, cast=int)
+# Folder of the weekly WW{n}.xlsx files served by the ingest endpoint
+SNAPSHOT_FOLDER = config("SNAPSHOT_FOLDER", default=None)
+# Cached waterfall / alert / chart results kept per store
+SNAPSHOT_RESULT_CACHE_ENTRIES = config("SNAPSHOT_RESULT_CACHE_ENTRIES", default=1024, cast=int)
+# Changes kept in the manifest's log
+SNAPSHOT_CHANGE_LOG = 200
+
+# Identity columns (with normalized headers) the snapshot files are sorted and filtered by
+KEY_COLUMNS = ["MaterialNumber", "Plant", "Site"]
+# Columns the waterfall analysis uses besides the lead time and the WWnn week columns
+BASE_COLUMNS = KEY_COLUMNS + ["Measures", "InventoryOn-Hand"]
+# Columns stored as text; every other decoded column (quantities, weeks, lead time) is stored as a number
+TEXT_COLUMNS = KEY_COLUMNS + ["Measures"]
+# Schema metadata key recording how the workbook typed each text column
+SOURCE_TYPES_METADATA = "snapshot_source_types"
+WEEK_COLUMN_PATTERN = re.compile(r"WW\d{2}")
+LEAD_TIME_HEADER = "lead time (week)"
+MANIFEST_VERSION = 5
+
+def strip_header(col):
+    """Header as the waterfall analysis names it: no line breaks or whitespace ("Inventory\\nOn-Hand" -> "InventoryOn-Hand")."""
+    return re.sub(r"\s+", "", str(col).strip().replace("\n", " "))
+
+def lookup_header(col):
+    """Header as matched when looking for a column by name ("Lead Time\\n(Week)" -> "lead time (week)")."""
+    return str(col).strip().replace("\n", " ").replace("\r", " ").replace("\t", " ").lower()
+
+def snapshot_week(filename):
+    """Week number of a WW{n}.xlsx snapshot file name, or None."""
+    match = re.fullmatch(r"WW(\d+)\.xlsx", filename)
+    return int(match.group(1)) if match else None
+
+def select_columns(headers):
+    """
+    Picks the columns of a snapshot sheet the waterfall analysis decodes.
+
+    Args:
+        headers (list): Raw header row of the sheet.
+
+    Returns:
+        dict: positions (of the decoded columns, ascending), names (their stripped headers)
+        and lead_column (stripped name of the lead time column, or None). When two headers
+        strip to the same name, the first one is kept.
+    """
+    positions, names = [], []
+    lead_column = None
+    for position, col in enumerate(headers):
+        if col is None:
+            continue
+        name = strip_header(col)
+        is_lead = lead_column is None and lookup_header(col) == LEAD_TIME_HEADER
+        if is_lead:
+            lead_column = name
+        if name in names or not (is_lead or name in BASE_COLUMNS or WEEK_COLUMN_PATTERN.fullmatch(name)):
+            continue
+        positions.append(position)
+        names.append(name)
+    return {"positions": positions, "names": names, "lead_column": lead_column}
+
+def snapshot_table(df):
+    """
+    Converts the decoded columns of a snapshot to an Arrow table, typed per column.
+
+    Excel columns are often mixed (a week column holding numbers and the odd text cell,
+    material numbers typed as numbers in some rows), which Arrow cannot store as one type.
+    Text columns are stored as strings (see key_text) and all others as numbers, with
+    cells that are not numbers becoming null, so week values stay numeric for the report
+    coloring and key lookups do not depend on how Excel typed a cell. How Excel typed each
+    text column is kept in the schema metadata, so reads give back the original dtype
+    (see restore_text_types).
+    """
+    arrays = {}
+    source_types = {}
+    for col in df.columns:
+        series = df[col]
+        if col in TEXT_COLUMNS:
+            arrays[col] = pa.array([None if pd.isna(value) else key_text(value) for value in series], type=pa.string())
+            source_types[col] = _source_type(series)
+        else:
+            arrays[col] = pa.array(pd.to_numeric(series, errors="coerce"), from_pandas=True)
+    table = pa.table(arrays)
+    return table.replace_schema_metadata({SOURCE_TYPES_METADATA: json.dumps(source_types)})
+
+def _source_type(series):
+    """How a text column was typed in the workbook: "integer", "floating" (numbers, some missing) or "text"."""
+    kind = pd.api.types.infer_dtype(series, skipna=True)
+    if kind == "integer" and not series.isna().any():
+        return "integer"
+    if kind in ("integer", "floating", "mixed-integer-float"):
+        return "floating"
+    return "text"
+
+def restore_text_types(df, schema):
+    """Converts the text columns of a read snapshot back to the numeric dtype they had in the workbook."""
+    metadata = schema.metadata or {}
+    source_types = json.loads(metadata.get(SOURCE_TYPES_METADATA.encode(), b"{}"))
+    for col, kind in source_types.items():
+        if kind != "text" and col in df.columns:
+            df[col] = pd.to_numeric(df[col]).astype("int64" if kind == "integer" else "float64")
+    return df
+
+_headers = {}
+_headers_lock = threading.Lock()
+
+def snapshot_header(path, fingerprint=None):
+    """
+    Resolves the decoded columns of a snapshot workbook (see select_columns) from its header row.
+
+    Only the first row is parsed, and the result is cached by file fingerprint, so header
+    normalization runs once per version of a file.
+    """
+    key = (os.path.abspath(path), fingerprint or file_fingerprint(path))
+    with _headers_lock:
+        header = _headers.get(key)
+    if header is None:
+        workbook = load_workbook(path, read_only=True)
+        try:
+            row = next(workbook.worksheets[0].iter_rows(max_row=1, values_only=True), ())
+        finally:
+            workbook.close()
+        header = select_columns(list(row))
+        with _headers_lock:
+            _headers[key] = header
+    return header
+
+def convert_workbook(source, target, header):
+    """
+    Converts one snapshot workbook to a sorted Parquet file. Runs in a worker process.
+
+    Only the columns in header are decoded. If the parsed headers do not match (e.g. the
+    sheet starts with blank rows), the whole sheet is read and the columns picked again.
+
+    Returns:
+        dict: columns, lead_column and rows of the written file.
+    """
+    df = read_excel(source, usecols=header["positions"]) if header["positions"] else None
+    if df is None or [strip_header(col) for col in df.columns] != header["names"]:
+        df = read_excel(source)
+        header = select_columns(list(df.columns))
+        df = df.iloc[:, header["positions"]]
+    df.columns = header["names"]
+
+    table = snapshot_table(df)
+    sort_keys = [(col, "ascending") for col in KEY_COLUMNS if col in table.column_names]
+    if sort_keys:
+        table = table.sort_by(sort_keys)
+    tmp_path = target + ".tmp"
+    pq.write_table(table, tmp_path, row_group_size=SNAPSHOT_ROW_GROUP_ROWS)
+    os.replace(tmp_path, target)
+    return {"columns": table.column_names, "lead_column": header["lead_column"], "rows": table.num_rows}
+
+_read_pool = None
+_read_pool_lock = threading.Lock()
+
+def _get_read_pool():
+    global _read_pool
+    with _read_pool_lock:
+        if _read_pool is None:
+            _read_pool = ThreadPoolExecutor(max_workers=max(1, SNAPSHOT_READ_THREADS), thread_name_prefix="snapshot-read")
+        return _read_pool
+
+class ResultCache:
+    """
+    Memoized results computed from a snapshot store: waterfall frames, alerts and charts.
+
+    Every entry records the snapshot weeks and the material it was computed from, so a
+    changed week only drops the entries that read it (and, for a replaced week, only those
+    of the materials whose rows changed). Values are deep-copied in and out, so callers
+    can modify what they get.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or SNAPSHOT_RESULT_CACHE_ENTRIES
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    def get_or_compute(self, kind, key, material, weeks, compute):
+        """
+        Returns the cached result of (kind, key), computing and storing it when missing.
+
+        Args:
+            kind (str): Result type, e.g. "waterfall", "alerts", "chart".
+            key (tuple): Parameters identifying the result.
+            material: Material the result depends on; None when it depends on all materials.
+            weeks (iterable): Snapshot weeks the result reads.
+            compute (callable): Computes the result.
+        """
+        cache_key = (kind, key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return copy.deepcopy(entry[2])
+            self.misses += 1
+            generation = self._generation
+        value = compute()
+        with self._lock:
+            # Not stored when a week changed while it was being computed
+            if generation == self._generation:
+                self._entries[cache_key] = (material, frozenset(weeks), copy.deepcopy(value))
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, week=None, materials=None):
+        """
+        Drops the results that read week for one of materials.
+
+        Args:
+            week (int): Changed snapshot week; None drops every result.
+            materials (list): Materials whose rows changed; None when all may have.
+
+        Returns:
+            int: Number of dropped results.
+        """
+        materials = None if materials is None else set(materials)
+        with self._lock:
+            self._generation += 1
+            stale = [
+                cache_key for cache_key, (material, weeks, _) in self._entries.items()
+                if week is None or (week in weeks and (materials is None or material is None or material in materials))
+            ]
+            for cache_key in stale:
+                del self._entries[cache_key]
+            self.invalidated += len(stale)
+        return len(stale)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "invalidated": self.invalidated}
+
+def snapshot_window(start_week, num_weeks=12):
+    """Snapshot weeks a waterfall starting at start_week reads."""
+    return list(range(max(1, start_week - num_weeks), start_week + 1))
+
+def material_digests(path):
+    """Order-independent hash of every material's rows in a converted snapshot (material -> int)."""
+    df = pq.read_table(path).to_pandas()
+    if "MaterialNumber" not in df.columns:
+        return {}
+    hashes = pd.util.hash_pandas_object(df, index=False)
+    return {material: int(value) for material, value in hashes.groupby(df["MaterialNumber"].to_numpy()).sum().items()}
+
+class SnapshotStore:
+    """
+    Columnar copy of a folder of weekly WW{n}.xlsx shortage snapshots.
+
+    Each workbook is converted once to a Parquet file holding only the columns the
+    waterfall analysis uses, with stripped headers, sorted by (MaterialNumber, Plant, Site)
+    and written in small row groups, so a lookup reads only the row groups of one material
+    and only the requested columns. Conversions are tracked by the workbook's size and
+    mtime and redone when it changes; several changed workbooks are converted in parallel.
+
+    Every conversion or removal is logged as a change (week and changed materials) and
+    drops the dependent entries of the store's ResultCache. Other processes sharing the
+    store (e.g. the ingest command) are picked up from the manifest's change log.
+
+    Files in store_dir:
+        WW{n}.parquet   the converted snapshot
+        manifest.json   per workbook: fingerprint, columns, lead time column, rows;
+                        the change log and its generation counter
+    """
+
+    def __init__(self, folder_path, store_dir=None):
+        self.folder_path = folder_path
+        key = hashlib.sha1(os.path.abspath(folder_path).encode()).hexdigest()[:16]
+        self.store_dir = store_dir or os.path.join(SNAPSHOT_STORE_DIR, key)
+        self.manifest_path = os.path.join(self.store_dir, "manifest.json")
+        self.results = ResultCache()
+        self._lock = threading.Lock()
+        os.makedirs(self.store_dir, exist_ok=True)
+        self._manifest_mtime = None
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        try:
+            self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                return manifest
+        except (OSError, ValueError):
+            pass
+        return {"version": MANIFEST_VERSION, "generation": 0, "files": {}, "changes": []}
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+        self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+
+    def _reload_if_changed(self):
+        """Loads the manifest written by another process and drops the results its changes affect."""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._manifest_mtime:
+            return
+        known = self.manifest["generation"]
+        manifest = self._load_manifest()
+        changes = [change for change in manifest["changes"] if change["generation"] > known]
+        if manifest["generation"] < known or (manifest["generation"] > known and (not changes or changes[0]["generation"] != known + 1)):
+            self.results.invalidate()  # the log no longer covers what happened since
+        for change in changes:
+            self.results.invalidate(change["week"], change["materials"])
+        self.manifest = manifest
+
+    def _record_change(self, filename, materials, rows):
+        self.manifest["generation"] += 1
+        change = {
+            "generation": self.manifest["generation"],
+            "filename": filename,
+            "week": snapshot_week(filename),
+            "materials": materials,
+            "rows": rows,
+            "time": time.time(),
+        }
+        self.manifest["changes"] = (self.manifest["changes"] + [change])[-SNAPSHOT_CHANGE_LOG:]
+        change["invalidated"] = self.results.invalidate(change["week"], materials) if change["week"] else 0
+        return change
+
+    def parquet_path(self, filename):
+        return os.path.join(self.store_dir, os.path.splitext(filename)[0] + ".parquet")
+
+    def _convert_all(self, filenames):
+        """Converts workbooks, in worker processes when there are several. Yields (filename, fingerprint, entry or exception)."""
+        jobs = []
+        for filename in filenames:
+            source = os.path.join(self.folder_path, filename)
+            try:
+                fingerprint = file_fingerprint(source)
+                jobs.append((filename, fingerprint, (source, self.parquet_path(filename), snapshot_header(source, fingerprint))))
+            except Exception as e:
+                yield filename, None, e
+
+        if SNAPSHOT_WORKERS > 0 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=min(SNAPSHOT_WORKERS, len(jobs))) as executor:
+                futures = [(filename, fingerprint, executor.submit(convert_workbook, *args)) for filename, fingerprint, args in jobs]
+                for filename, fingerprint, future in futures:
+                    try:
+                        yield filename, fingerprint, future.result()
+                    except Exception as e:
+                        yield filename, fingerprint, e
+        else:
+            for filename, fingerprint, args in jobs:
+                try:
+                    yield filename, fingerprint, convert_workbook(*args)
+                except Exception as e:
+                    yield filename, fingerprint, e
+
+    def _update(self, filenames):
+        """
+        (Re)converts workbooks and logs what changed. The caller holds the lock and saves the manifest.
+
+        A new week changes all materials (a material without rows still gets an empty week);
+        a replaced week changes the materials whose rows differ from the previous version.
+
+        Returns:
+            list: One change record per workbook; failed conversions have an "error".
+        """
+        previous = {}
+        for filename in filenames:
+            if filename in self.manifest["files"] and os.path.exists(self.parquet_path(filename)):
+                try:
+                    previous[filename] = material_digests(self.parquet_path(filename))
+                except Exception as e:
+                    logger.warning(f"Could not read the previous version of {filename}: {e}")
+
+        changes = []
+        for filename, fingerprint, result in self._convert_all(filenames):
+            if isinstance(result, Exception):
+                logger.error(f"Could not convert {filename}: {result}")
+                existed = self.manifest["files"].pop(filename, None) is not None
+                change = self._record_change(filename, None, 0) if existed else {"filename": filename, "week": snapshot_week(filename)}
+                changes.append({**change, "error": str(result)})
+                continue
+            self.manifest["files"][filename] = {"fingerprint": fingerprint, **result}
+            materials = None
+            if filename in previous:
+                current = material_digests(self.parquet_path(filename))
+                old = previous[filename]
+                materials = sorted((material for material in old.keys() | current.keys() if old.get(material) != current.get(material)), key=str)
+            changes.append(self._record_change(filename, materials, result["rows"]))
+        return changes
+
+    def sync(self):
+        """
+        Brings the store up to date with the folder: converts new or changed workbooks, drops removed ones.
+
+        Returns:
+            list: Change records of the converted or removed workbooks.
+        """
+        with self._lock:
+            started = time.perf_counter()
+            self._reload_if_changed()
+            names = os.listdir(self.folder_path) if os.path.isdir(self.folder_path) else []
+            current = {name for name in names if name.endswith(".xlsx")}
+            stale = []
+            for filename in sorted(current):
+                entry = self.manifest["files"].get(filename)
+                source = os.path.join(self.folder_path, filename)
+                if entry is None or entry["fingerprint"] != file_fingerprint(source) or not os.path.exists(self.parquet_path(filename)):
+                    stale.append(filename)
+
+            changes = self._update(stale)
+            if stale:
+                logger.info(f"Converted {len(stale)} snapshot(s) to Parquet in {time.perf_counter() - started:.2f}s")
+
+            for filename in sorted(set(self.manifest["files"]) - current):
+                del self.manifest["files"][filename]
+                if os.path.exists(self.parquet_path(filename)):
+                    os.remove(self.parquet_path(filename))
+                changes.append(self._record_change(filename, None, 0))
+            if changes:
+                self._save_manifest()
+            return changes
+
+    def ingest(self, source, filename):
+        """
+        Adds or replaces one weekly snapshot: copies it into the folder and converts only that file.
+
+        Args:
+            source (str): Path of the new workbook.
+            filename (str): Its name in the folder, WW{n}.xlsx.
+
+        Returns:
+            dict: The change record: generation, filename, week, materials (None when all changed),
+            rows, time and the number of invalidated cached results.
+
+        Raises:
+            ValueError: The name is not WW{n}.xlsx or the workbook cannot be read; the folder
+            is left as it was.
+        """
+        if snapshot_week(filename) is None or os.path.basename(filename) != filename:
+            raise ValueError(f"Snapshot files must be named WW<week>.xlsx, got {filename!r}")
+        started = time.perf_counter()
+        target = os.path.join(self.folder_path, filename)
+        backup = target + ".previous"
+        with self._lock:
+            self._reload_if_changed()
+            os.makedirs(self.folder_path, exist_ok=True)
+            if os.path.exists(target):
+                os.replace(target, backup)
+            shutil.copyfile(source, target + ".tmp")
+            os.replace(target + ".tmp", target)
+
+            change = self._update([filename])[0]
+            if "error" in change:
+                os.remove(target)
+                if os.path.exists(backup):
+                    os.replace(backup, target)
+                    self._update([filename])
+                self._save_manifest()
+                raise ValueError(f"Could not read {filename}: {change['error']}")
+            if os.path.exists(backup):
+                os.remove(backup)
+            self._save_manifest()
+        changed = "all" if change["materials"] is None else len(change["materials"])
+        logger.info(f"Ingested {filename} in {time.perf_counter() - started:.2f}s: {changed} material(s) changed, {change['invalidated']} cached result(s) dropped")
+        return change
+
+    def cached(self, kind, key, material, start_week, num_weeks, compute):
+        """Result of compute, memoized in the store's ResultCache with the weeks of the waterfall window as dependencies."""
+        material = None if material is None else key_text(material)
+        return self.results.get_or_compute(kind, key, material, snapshot_window(start_week, num_weeks), compute)
+
+    def summary(self):
+        """Weeks, rows and recent changes of the store, with the result cache counters."""
+        return {
+            "folder": self.folder_path,
+            "generation": self.manifest["generation"],
+            "files": {filename: {"rows": entry["rows"], "week": snapshot_week(filename)} for filename, entry in sorted(self.manifest["files"].items())},
+            "changes": [
+                {**change, "materials": None if change["materials"] is None else len(change["materials"])}
+                for change in self.manifest["changes"][-10:]
+            ],
+            "results": self.results.stats(),
+        }
+
+    def files(self):
+        """Names of the workbooks in the store."""
+        return sorted(self.manifest["files"])
+
+    def columns(self, filename):
+        return self.manifest["files"][filename]["columns"]
+
+    def lead_column(self, filename):
+        return self.manifest["files"][filename]["lead_column"]
+
+    def read(self, filename, columns=None, **keys):
+        """
+        Reads rows of a converted snapshot.
+
+        Args:
+            filename (str): Workbook name, e.g. "WW05.xlsx".
+            columns (list): Columns to decode (stripped headers); all when None. Missing ones are skipped.
+            **keys: Filters on KEY_COLUMNS, a value or a list of accepted values, e.g. MaterialNumber="M1".
+                Key columns are text, so values are compared by key_text (MaterialNumber=1234 matches "1234"),
+                and filtered while reading, so only matching row groups are decoded.
+
+        Returns:
+            pandas.DataFrame: The matching rows, key columns with the dtype they had in the workbook.
+        """
+        path = self.parquet_path(filename)
+        schema = pq.read_schema(path)
+        if columns is not None:
+            columns = [col for col in dict.fromkeys(list(keys) + list(columns)) if col in schema.names]
+
+        pushdown = None
+        remaining = {}
+        for col, value in keys.items():
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            if col not in schema.names:
+                remaining[col] = values
+            elif pa.types.is_string(schema.field(col).type) or pa.types.is_large_string(schema.field(col).type):
+                values = list(dict.fromkeys(key_text(value) for value in values))
+                if not values:
+                    return restore_text_types(pq.read_table(path, columns=columns).slice(0, 0).to_pandas(), schema)
+                condition = pc.field(col).isin(values) if len(values) != 1 else pc.field(col) == values[0]
+                pushdown = condition if pushdown is None else pushdown & condition
+            else:
+                remaining[col] = values
+
+        df = restore_text_types(pq.read_table(path, columns=columns, filters=pushdown).to_pandas(), schema)
+        # Columns not in the file (or not stored as text) are compared like the Excel path did
+        for col, values in remaining.items():
+            df = df[df[col].isin(values)] if col in df.columns else df.iloc[0:0]
+        return df
+
+    def read_many(self, filenames, columns=None, **keys):
+        """
+        Starts reading several snapshots concurrently (see read) on the shared read threads.
+
+        Returns:
+            dict: File name -> Future of its DataFrame, in the order given.
+        """
+        pool = _get_read_pool()
+        return {filename: pool.submit(self.read, filename, columns, **keys) for filename in filenames}
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def _store_for(folder_path):
+    key = os.path.abspath(folder_path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = SnapshotStore(folder_path)
+            _stores[key] = store
+        return store
+
+def get_snapshot_store(folder_path):
+    """The snapshot store of folder_path, synced with the folder."""
+    store = _store_for(folder_path)
+    store.sync()
+    return store
+
+def ingest_snapshot(source, filename, folder_path=None):
+    """Ingests one weekly workbook into the store of folder_path (SNAPSHOT_FOLDER by default); see SnapshotStore.ingest."""
+    folder_path = folder_path or SNAPSHOT_FOLDER
+    if not folder_path:
+        raise RuntimeError("SNAPSHOT_FOLDER is not configured")
+    return _store_for(folder_path).ingest(source, filename)
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest weekly shortage snapshots into the waterfall snapshot store.")
+    parser.add_argument("folder", help="Folder of the WW{n}.xlsx snapshots")
+    parser.add_argument("files", nargs="*", help="New or replaced WW{n}.xlsx workbooks; without any, the folder is synced")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if args.files:
+        changes = [ingest_snapshot(path, os.path.basename(path), args.folder) for path in args.files]
+    else:
+        changes = get_snapshot_store(args.folder).sync()
+    for change in changes:
+        materials = "all" if change.get("materials") is None else len(change["materials"])
+        print(f"{change['filename']}: week {change['week']}, {change.get('rows', 0)} rows, {materials} material(s) changed")
+
+if __name__ == "__main__":
+    main()
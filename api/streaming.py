@@ -0,0 +1,65 @@
+import json
+import logging
+import pandas as pd
+from openpyxl import load_workbook
+from api.responses import dataframe_json_lines
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 5000
+def iter_excel_chunks(source, chunk_size=DEFAULT_CHUNK_SIZE, sheet_name=None):
+    """
+    Reads an XLSX workbook row-chunk by row-chunk without materializing the whole sheet.
+
+    Args:
+        source: Path or seekable file-like object containing the workbook.
+        chunk_size (int): Number of data rows per yielded DataFrame.
+        sheet_name (str): Sheet to read, defaults to the first sheet.
+
+    Yields:
+        pandas.DataFrame: Consecutive slices of the sheet, using the first row as header.
+    """
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name else wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(col) if col is not None else f"Unnamed: {i}" for i, col in enumerate(header)]
+
+        buffer = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue  # read_only sheets may report trailing empty rows
+            buffer.append(row)
+            if len(buffer) >= chunk_size:
+                yield pd.DataFrame(buffer, columns=columns)
+                buffer = []
+
+        if buffer:
+            yield pd.DataFrame(buffer, columns=columns)
+    finally:
+        wb.close()
+
+def ndjson_stream(chunks, clean=None):
+    """
+    Converts an iterable of DataFrame chunks into newline-delimited JSON bytes.
+
+    Each record becomes one line, so the client can render rows before the whole
+    upload has been processed and the server only holds one chunk at a time.
+    """
+    total_rows = 0
+    for chunk in chunks:
+        if clean is not None:
+            chunk = clean(chunk)
+        if chunk.empty:
+            continue
+        total_rows += len(chunk)
+        yield dataframe_json_lines(chunk)
+    logger.info(f"Streamed {total_rows} rows as NDJSON")
+
+def ndjson_error(message):
+    """Single NDJSON line used to report a failure after the stream has started."""
+    return json.dumps({"error": message}).encode("utf-8") + b"\n"
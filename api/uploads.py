@@ -0,0 +1,176 @@
+import hashlib
+import logging
+import os
+import tempfile
+import zipfile
+from decouple import config
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# Largest request body accepted by any endpoint, checked before the body is parsed
+MAX_REQUEST_MB = config("MAX_REQUEST_MB", default=512, cast=int)
+# Largest single uploaded file
+MAX_UPLOAD_MB = config("MAX_UPLOAD_MB", default=256, cast=int)
+# Decompression limits of ZIP archives (including XLSX workbooks), from the sizes declared in the archive
+MAX_ZIP_MEMBER_MB = config("MAX_ZIP_MEMBER_MB", default=512, cast=int)
+MAX_ZIP_TOTAL_MB = config("MAX_ZIP_TOTAL_MB", default=2048, cast=int)
+MAX_ZIP_RATIO = config("MAX_ZIP_RATIO", default=200, cast=int)
+# Where uploads are spooled; defaults to the system temp directory
+UPLOAD_SPOOL_DIR = config("UPLOAD_SPOOL_DIR", default=None)
+
+SPOOL_CHUNK_SIZE = 1024 * 1024
+MB = 1024 * 1024
+
+class ZipLimitError(ValueError):
+    """An archive would decompress beyond the configured limits."""
+
+def check_zip_limits(source, extension=None, max_member=MAX_ZIP_MEMBER_MB * MB, max_total=MAX_ZIP_TOTAL_MB * MB, max_ratio=MAX_ZIP_RATIO):
+    """
+    Rejects ZIP decompression bombs before anything is extracted.
+
+    Only the central directory is read. The declared sizes can be trusted as an upper
+    bound, because zipfile never returns more than a member's declared file_size.
+
+    Args:
+        source: Path or seekable file-like object of the archive.
+        extension (str): Only members with this extension are counted (the ones that will be read).
+
+    Raises:
+        ZipLimitError: A member or the whole archive expands beyond the limits.
+        zipfile.BadZipFile: source is not a ZIP archive.
+    """
+    total = 0
+    with zipfile.ZipFile(source) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or (extension and not info.filename.lower().endswith(extension)):
+                continue
+            if info.file_size > max_member:
+                raise ZipLimitError(f"{info.filename} expands to {info.file_size // MB} MB, the limit is {max_member // MB} MB")
+            if info.file_size > MB and info.file_size > max_ratio * max(info.compress_size, 1):
+                raise ZipLimitError(f"{info.filename} has a suspicious compression ratio ({info.file_size // max(info.compress_size, 1)}:1)")
+            total += info.file_size
+    if total > max_total:
+        raise ZipLimitError(f"Archive expands to {total // MB} MB, the limit is {max_total // MB} MB")
+    return total
+
+class SpooledUpload:
+    """
+    An uploaded file copied to a named temp file on disk.
+
+    Worker processes open it by path (memory-mapped where the reader supports it),
+    so the upload is never held as a bytes object or pickled between processes.
+    The SHA-256 is computed while copying. Remove the file with close().
+    """
+
+    def __init__(self, path, filename, size, digest, head):
+        self.path = path
+        self.filename = filename
+        self.size = size
+        self.digest = digest
+        self.head = head
+
+    def close(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _copy_upload(source, filename, max_bytes):
+    source.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    fd, path = tempfile.mkstemp(prefix="upload-", suffix=os.path.splitext(filename or "")[1], dir=UPLOAD_SPOOL_DIR)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = source.read(SPOOL_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"File is larger than the {max_bytes // MB} MB limit.")
+                if len(head) < 8:
+                    head += chunk[:8 - len(head)]
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return SpooledUpload(path, filename, size, digest.hexdigest(), head)
+
+async def spool_upload(upload_file, max_bytes=MAX_UPLOAD_MB * MB, archive_extension=None):
+    """
+    Streams an UploadFile to disk in chunks and checks it against the size limits.
+
+    ZIP-based files (ZIP archives, XLSX workbooks) are also checked with check_zip_limits.
+
+    Args:
+        upload_file (UploadFile): The uploaded file.
+        max_bytes (int): Largest accepted file size.
+        archive_extension (str): For archives, only members with this extension are checked.
+
+    Returns:
+        SpooledUpload: The spooled copy; the caller must close() it.
+
+    Raises:
+        HTTPException: 413 when the file or its decompressed contents exceed the limits.
+    """
+    upload = await run_in_threadpool(_copy_upload, upload_file.file, upload_file.filename, max_bytes)
+    if upload.head.startswith(b"PK"):
+        try:
+            await run_in_threadpool(check_zip_limits, upload.path, archive_extension)
+        except ZipLimitError as e:
+            upload.close()
+            logger.warning(f"Rejected {upload.filename}: {e}")
+            raise HTTPException(status_code=413, detail=str(e))
+        except zipfile.BadZipFile:
+            pass  # reported by the parser
+    logger.info(f"Spooled {upload.filename} ({upload.size} bytes)")
+    return upload
+
+class RequestSizeLimitMiddleware:
+    """
+    ASGI middleware rejecting request bodies over max_bytes with 413.
+
+    A declared Content-Length over the limit is refused before the body is read;
+    chunked bodies are counted as they arrive and cut off once they pass it, so an
+    oversized upload is never spooled completely.
+    """
+
+    def __init__(self, app, max_bytes=MAX_REQUEST_MB * MB):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body is larger than the {self.max_bytes // MB} MB limit."
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def receive_limited():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, receive_limited, send)
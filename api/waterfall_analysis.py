@@ -1,10 +1,29 @@
-import plotly.graph_objects as go
+import logging
 import pandas as pd
 import numpy as np
 import os
+import re
 from io import BytesIO
-from openpyxl import load_workbook
+from openpyxl import Workbook
+from openpyxl.formatting.rule import FormulaRule
 from openpyxl.styles import PatternFill
+from openpyxl.utils import get_column_letter
+from api.excel_reader import read_excel
+from api.snapshot_store import get_snapshot_store, key_text, snapshot_window
+
+logger = logging.getLogger(__name__)
+
+try:
+    import plotly.graph_objects as go
+    HAS_PLOTLY = True
+except ImportError:
+    HAS_PLOTLY = False
+
+try:
+    import xlsxwriter
+    HAS_XLSXWRITER = True
+except ImportError:
+    HAS_XLSXWRITER = False
 
 def generate_weeks_range(start_week, num_weeks=12):
     #weeks_range = [f"WW{str((start_week + i - num_weeks) % 52 or 52).zfill(2)}" for i in range(2 * num_weeks + 1)]
@@ -14,7 +33,7 @@ def generate_weeks_range(start_week, num_weeks=12):
         if start_week-num_weeks < 1 and week > start_week + num_weeks: #edge case in case you want to check shortage data for week 2 ,e.g.
             continue
         weeks_range.append(f"WW{str(week).zfill(2)}")
-    print(weeks_range)
+    logger.debug(f"Weeks range: {weeks_range}")
     return weeks_range
 
 # Function to normalize column names
@@ -26,43 +45,21 @@ def save_to_excel(df, output_file):
     if df is not None:
         try:
             df.to_excel(output_file, index=False)
-            print(f"Data saved to '{output_file}'.")
+            logger.info(f"Data saved to '{output_file}'.")
         except Exception as e:
-            print(f"Error saving to Excel: {e}")
+            logger.error(f"Error saving to Excel: {e}")
     else:
-        print("No data to save.")
-
-def extract_and_aggregate_weekly_data(folder_path, material_number, plant, site, start_week, num_weeks=12):
-    """
-    Extracts and aggregates weekly data for a specific material number, plant, and site,
-    starting from a specified week and including the next 'num_weeks' weeks.
-
-    Args:
-        folder_path (str): Path to the folder containing the XLSX files.
-        material_number (str): Material number to filter.
-        plant (str): Plant to filter.
-        site (str): Site to filter.
-        start_week (str): Starting week (e.g., "WW32").
-        num_weeks (int): Number of weeks to include in the output.
-
-    Returns:
-        pandas.DataFrame: DataFrame containing the aggregated weekly data, or None if no data is found.
-    """
-
-    if not os.path.exists(folder_path):
-        print(f"Error: Folder '{folder_path}' not found.")
-        return None
-    
-    print(folder_path)
-
-    all_files = sorted([f for f in os.listdir(folder_path) if f.endswith(".xlsx")])
+        logger.warning("No data to save.")
 
-    if not all_files:
-        print(f"Error: No XLSX files found in '{folder_path}'.")
-        return None
+def _read_snapshot_window(store, week_numbers, columns, **keys):
+    """Starts reading the stored snapshots of week_numbers concurrently, with columns plus each file's lead time column."""
+    files = [f"WW{i}.xlsx" for i in week_numbers if f"WW{i}.xlsx" in store.files()]
+    lead_columns = [store.lead_column(f) for f in files if store.lead_column(f)]
+    return store.read_many(files, columns=columns + list(dict.fromkeys(lead_columns)), **keys)
 
-    week_numbers = list(range(max(1, start_week - num_weeks), start_week + 1))
-    #print(week_numbers)
+def _extract_weekly_data(store, all_files, material_number, plant, site, start_week, num_weeks):
+    """The uncached part of extract_and_aggregate_weekly_data."""
+    week_numbers = snapshot_window(start_week, num_weeks)
 
     selected_data = []
     selected_weeks = []
@@ -70,43 +67,31 @@ def extract_and_aggregate_weekly_data(folder_path, material_number, plant, site,
     #Columns to add to the final df
     initial_columns = ["MaterialNumber", "Plant", "Site", "Measures", "InventoryOn-Hand"]
     weeks_range = generate_weeks_range(start_week,num_weeks)
-    #print(weeks_range)
+
+    # Read all weeks concurrently; each read decodes only the material's rows and the window's columns
+    reads = _read_snapshot_window(store, week_numbers, initial_columns + weeks_range, MaterialNumber=material_number)
 
     for i in week_numbers:
         week_file = f"WW{i}.xlsx"
         week_col = f"WW{i:02d}"
 
         if week_file in all_files:
-            file_path = os.path.join(folder_path, week_file)
             try:
-                df = pd.read_excel(file_path)
-                filtered_df = df[
-                    (df["Material Number"] == material_number)
-                    & (df["Plant"] == plant)
-                    & (df["Site"] == site)
-                ]
-
-                lead_value = 0
+                if week_file not in reads:
+                    raise ValueError("the file could not be converted to the snapshot store")
 
-                if i == start_week:
+                # Lead Time column, as found (normalized) when the file was converted
+                lead_col = store.lead_column(week_file) if i == start_week else None
 
-                    # Lead Time column, normalized
-                    target_col = normalize("Lead Time (Week)")
-                    lead_col = None
+                df = reads[week_file].result()
+                # Compared as key_text, like the store's key filters, whatever type plant and site are given as
+                filtered_df = df[(df["Plant"].map(key_text) == key_text(plant)) & (df["Site"].map(key_text) == key_text(site))]
 
-                    # Loop to find the unnormalized matching column
-                    for col in df.columns:
-                        if normalize(col) == target_col:
-                            lead_col = col
-                            break
+                lead_value = 0
 
-                    if lead_col:
-                        lead_value = df.loc[df["Material Number"] == material_number, lead_col]
+                if lead_col:
+                    lead_value = df[lead_col]
 
-                
-                #Remove whitespace in column names
-                filtered_df.columns = filtered_df.columns.str.strip().str.replace('\n', ' ', regex=False).str.replace(r'\s+', '', regex=True)
-        
                 if not filtered_df.empty:
                     # Select only the required columns
                     all_columns = initial_columns + weeks_range
@@ -140,14 +125,14 @@ def extract_and_aggregate_weekly_data(folder_path, material_number, plant, site,
                     selected_weeks.append(f"WW{i:02d}")
 
             except FileNotFoundError:
-                print(f"Error: File '{week_file}' not found.")
+                logger.error(f"File '{week_file}' not found.")
             except Exception as e:
-                print(f"Error reading file '{week_file}': {e}")
+                logger.error(f"Error reading file '{week_file}': {e}")
         else:
-            print(f"Warning: Week file '{week_file}' not found.")
+            logger.warning(f"Week file '{week_file}' not found.")
 
     if not selected_data:
-        print("No matching data found.")
+        logger.warning("No matching data found.")
         return None
 
     result_df = pd.concat(selected_data, ignore_index=True)
@@ -159,57 +144,326 @@ def extract_and_aggregate_weekly_data(folder_path, material_number, plant, site,
 
     return result_df, lead_value
 
-def plot_stock_prediction_plotly(df, start_week, lead_time, weeks_range):
-    """Plots actual and predicted stock values over weeks."""
+def extract_and_aggregate_weekly_data(folder_path, material_number, plant, site, start_week, num_weeks=12):
+    """
+    Extracts and aggregates weekly data for a specific material number, plant, and site,
+    starting from a specified week and including the next 'num_weeks' weeks.
 
-    weeks = generate_weeks_range(start_week, weeks_range)
-    stock_values = df[df['Measures'] == 'Weeks of Stock']
+    Args:
+        folder_path (str): Path to the folder containing the XLSX files.
+        material_number (str): Material number to filter.
+        plant (str): Plant to filter.
+        site (str): Site to filter.
+        start_week (str): Starting week (e.g., "WW32").
+        num_weeks (int): Number of weeks to include in the output.
 
-    fig = go.Figure()
+    Returns:
+        pandas.DataFrame: DataFrame containing the aggregated weekly data, or None if no data is found.
+    """
 
-    actual_values = []
-    predicted_values = []
-    plot_weeks_actual = []
-    plot_weeks_predicted = []
-
-    for i, week in enumerate(weeks):
-        print(i)
-        print(predicted_values)
-        if week not in df.columns:
-            print(f"Warning: Week {week} not found in DataFrame.")
-            continue  # skip the iteration if the week is not in the dataframe.
-
-        if week in df['Snapshot'].values: # Only get actual values if the week is in the snapshot.
-            actual_value = stock_values[stock_values['Snapshot'] == week][week].iloc[0]
-            if actual_value is None or np.isnan(actual_value):
-                actual_value = 0  # if actual value is none or nan, set to 0.
-            actual_values.append(actual_value)
-            plot_weeks_actual.append(week)
-        else:
-            break
+    if not os.path.exists(folder_path):
+        logger.error(f"Folder '{folder_path}' not found.")
+        return None
+    
+    logger.debug(f"Snapshot folder: {folder_path}")
 
-        if i != 0:
-            predicted_value = stock_values[stock_values['Snapshot'] == weeks[i - 1]][week].iloc[0]
-        else:
-            predicted_value = None
+    all_files = sorted([f for f in os.listdir(folder_path) if f.endswith(".xlsx")])
+
+    if not all_files:
+        logger.error(f"No XLSX files found in '{folder_path}'.")
+        return None
+
+    # Columnar copy of the workbooks, converted once per file version; the result is
+    # cached until one of the weeks it reads changes for this material
+    store = get_snapshot_store(folder_path)
+    return store.cached(
+        "waterfall", (material_number, plant, site, start_week, num_weeks), material_number, start_week, num_weeks,
+        lambda: _extract_weekly_data(store, all_files, material_number, plant, site, start_week, num_weeks),
+    )
+
+def extract_and_aggregate_weekly_data_batch(folder_path, start_week, num_weeks=12, materials=None):
+    """
+    Batch version of extract_and_aggregate_weekly_data for every (material, plant, site) at once.
+
+    Each weekly snapshot is read once. The diagonal window of every key (its week columns
+    shift by one for each earlier week in which it had rows) is applied to all rows of a
+    week together, then the rows are split per key.
+
+    Args:
+        folder_path (str): Path to the folder containing the XLSX files.
+        start_week (int): Starting week number.
+        num_weeks (int): Number of weeks to include in the output.
+        materials (list): Material numbers to compute; all materials when None.
+
+    Returns:
+        dict: (material_number, plant, site) -> (DataFrame, lead_value), the same frames as
+        extract_and_aggregate_weekly_data except that week columns may be float instead of int,
+        or None if no data is found.
+    """
+
+    if not os.path.exists(folder_path):
+        logger.error(f"Folder '{folder_path}' not found.")
+        return None
+
+    all_files = sorted([f for f in os.listdir(folder_path) if f.endswith(".xlsx")])
+
+    if not all_files:
+        logger.error(f"No XLSX files found in '{folder_path}'.")
+        return None
+
+    return _extract_weekly_data_batch(get_snapshot_store(folder_path), all_files, start_week, num_weeks, materials)
+
+def _extract_weekly_data_batch(store, all_files, start_week, num_weeks, materials):
+    """The part of extract_and_aggregate_weekly_data_batch after the folder checks."""
+    week_numbers = snapshot_window(start_week, num_weeks)
+    key_columns = ["MaterialNumber", "Plant", "Site"]
+    initial_columns = key_columns + ["Measures", "InventoryOn-Hand"]
+    weeks_range = generate_weeks_range(start_week, num_weeks)
+    filters = {} if materials is None else {"MaterialNumber": list(materials)}
+    reads = _read_snapshot_window(store, week_numbers, initial_columns + weeks_range, **filters)
+
+    selected_data = []
+    # Weeks each key has had rows in so far, i.e. how far its window has shifted
+    shifts = pd.Series(0, index=pd.MultiIndex.from_tuples([], names=key_columns), dtype="int64")
+    lead_values = None
+
+    for i in week_numbers:
+        week_file = f"WW{i}.xlsx"
+        week_col = f"WW{i:02d}"
+
+        if week_file not in all_files:
+            logger.warning(f"Week file '{week_file}' not found.")
+            continue
+        try:
+            if week_file not in reads:
+                raise ValueError("the file could not be converted to the snapshot store")
 
-        if predicted_value is None or np.isnan(predicted_value):
-            if i > 0:
-                predicted_value = predicted_values[-1]  # use the previous predicted value if the current one is None or NaN
-            else:
-                predicted_value = 0  # skip the first one as it is none.
+            lead_col = store.lead_column(week_file) if i == start_week else None
+            df = reads[week_file].result()
 
-        predicted_values.append(predicted_value)
-        plot_weeks_predicted.append(week)
+            lead_values = None
+            if lead_col:
+                lead_values = {material: values for material, values in df.groupby("MaterialNumber", sort=False)[lead_col]}
+                lead_values[None] = df[lead_col].iloc[0:0]
 
-    fig.add_trace(go.Scatter(x=plot_weeks_actual, y=actual_values, mode='lines+markers', name='Actual Weeks of Stock'))
-    fig.add_trace(go.Scatter(x=plot_weeks_predicted, y=predicted_values, mode='lines+markers', name='Predicted Weeks of Stock'))
+            df = df.dropna(subset=key_columns)
+            keys = pd.MultiIndex.from_frame(df[key_columns])
+            shift = shifts.reindex(keys, fill_value=0).to_numpy()
+
+            # A key whose window columns are missing from the file skips the week, as in the single version
+            complete = np.array([all(col in df.columns for col in initial_columns + weeks_range[k:]) for k in range(len(weeks_range) + 1)])
+            valid = complete[np.minimum(shift, len(weeks_range))]
+            df, keys, shift = df[valid], keys[valid], shift[valid]
+
+            # Blank the week columns that have already shifted out of each key's window
+            week_columns = [col for col in weeks_range if col in df.columns]
+            positions = np.array([weeks_range.index(col) for col in week_columns], dtype="int64")
+            blanked = df[week_columns].mask(positions[None, :] < shift[:, None])
+
+            week_df = pd.concat([df[initial_columns], blanked], axis=1)
+            week_df.insert(0, "Snapshot", week_col)
+            selected_data.append(week_df)
+
+            seen = keys.unique()
+            shifts = shifts.add(pd.Series(1, index=seen, dtype="int64"), fill_value=0).astype("int64")
+        except Exception as e:
+            logger.error(f"Error reading file '{week_file}': {e}")
+
+    if not selected_data:
+        logger.warning("No matching data found.")
+        return None
+
+    columns = ["Snapshot"] + initial_columns + weeks_range
+    result_df = pd.concat(selected_data, ignore_index=True).reindex(columns=columns)
+
+    results = {}
+    for key, group in result_df.groupby(key_columns, sort=False):
+        lead_value = 0 if lead_values is None else lead_values.get(key[0], lead_values[None])
+        results[key] = (group.reset_index(drop=True), lead_value)
+    return results
+
+# Materials extracted together when the batch waterfalls are streamed, e.g. into a report
+BATCH_CHUNK_MATERIALS = 100
+
+def iter_waterfalls_batch(folder_path, start_week, num_weeks=12, materials=None, chunk_materials=BATCH_CHUNK_MATERIALS):
+    """
+    Yields the waterfalls of extract_and_aggregate_weekly_data_batch one key at a time.
+
+    Materials are extracted chunk_materials at a time (the snapshot reads are filtered on
+    them), so only one chunk of frames is held in memory however many keys there are.
+
+    Args:
+        folder_path (str): Path to the folder containing the XLSX files.
+        start_week (int): Starting week number.
+        num_weeks (int): Number of weeks to include in the output.
+        materials (list): Material numbers to compute; all materials of the window when None.
+        chunk_materials (int): Materials extracted per pass.
+
+    Yields:
+        tuple: (key, DataFrame, lead_value), grouped by material in order of first appearance.
+    """
+    if not os.path.exists(folder_path):
+        logger.error(f"Folder '{folder_path}' not found.")
+        return
+
+    all_files = sorted([f for f in os.listdir(folder_path) if f.endswith(".xlsx")])
+
+    if not all_files:
+        logger.error(f"No XLSX files found in '{folder_path}'.")
+        return
+
+    store = get_snapshot_store(folder_path)
+    if materials is None:
+        files = [f"WW{i}.xlsx" for i in snapshot_window(start_week, num_weeks) if f"WW{i}.xlsx" in store.files()]
+        materials = {}
+        for future in store.read_many(files, columns=["MaterialNumber"]).values():
+            materials.update(dict.fromkeys(future.result()["MaterialNumber"].dropna()))
+    materials = list(dict.fromkeys(materials))
+
+    for start in range(0, len(materials), chunk_materials):
+        results = _extract_weekly_data_batch(store, all_files, start_week, num_weeks, materials[start:start + chunk_materials])
+        for key, (df, lead_value) in (results or {}).items():
+            yield key, df, lead_value
+
+def _weeks_of_stock_arrays(df, key_columns, weeks):
+    """
+    Actual and one-week-ahead predicted Weeks of Stock of every key in a waterfall frame.
+
+    The 'Weeks of Stock' rows are laid out as a (key x snapshot x target week) array: the
+    actual value of a week is on the diagonal (its own snapshot), the prediction on the
+    diagonal above it (the previous snapshot).
+
+    Returns:
+        tuple: keys (list of key tuples), valid (keys x weeks bool: week is part of the series),
+        actual and predicted (keys x weeks float arrays).
+    """
+    labels = list(dict.fromkeys(weeks))
+    label_index = {label: position for position, label in enumerate(labels)}
+    idx = np.array([label_index[week] for week in weeks], dtype="int64")
+
+    if key_columns and df.empty:
+        # MultiIndex.from_frame cannot infer the levels of an empty frame: no keys, empty arrays
+        codes, keys = np.zeros(0, dtype="int64"), []
+    elif key_columns:
+        codes, uniques = pd.MultiIndex.from_frame(df[key_columns]).factorize()
+        keys = list(uniques)
+    else:
+        codes, keys = np.zeros(len(df), dtype="int64"), [()]
+    n_keys, n_labels = len(keys), len(labels)
+
+    snapshots = df["Snapshot"].map(label_index).to_numpy()
+    in_window = ~pd.isna(snapshots)
+    snapshots = np.where(in_window, snapshots, -1).astype("int64")
+    has_snapshot = np.zeros((n_keys, n_labels), dtype=bool)
+    has_snapshot[codes[in_window], snapshots[in_window]] = True
+
+    # First 'Weeks of Stock' row of each key and snapshot
+    candidates = np.flatnonzero((df["Measures"] == "Weeks of Stock").to_numpy() & in_window)
+    duplicated = pd.DataFrame({"key": codes[candidates], "snapshot": snapshots[candidates]}).duplicated().to_numpy()
+    rows = np.zeros(len(df), dtype=bool)
+    rows[candidates[~duplicated]] = True
+    week_columns = [label for label in labels if label in df.columns]
+    columns = np.array([label_index[label] for label in week_columns], dtype="int64")
+    values = np.full((n_keys, n_labels, n_labels), np.nan)
+    if week_columns and rows.any():
+        stock = df.loc[rows, week_columns].apply(pd.to_numeric, errors="coerce").to_numpy(dtype="float64")
+        values[codes[rows][:, None], snapshots[rows][:, None], columns[None, :]] = stock
+
+    # Weeks missing as a column are skipped; the series stops at the first week without a snapshot
+    has_column = np.isin(np.array(weeks, dtype=object), week_columns)
+    stops = has_column[None, :] & ~has_snapshot[:, idx]
+    ends = np.where(stops.any(axis=1), stops.argmax(axis=1), len(weeks))
+    valid = has_column[None, :] & (np.arange(len(weeks))[None, :] < ends[:, None])
+
+    actual = np.nan_to_num(values[:, idx, idx], nan=0.0)
+    predicted = np.full((n_keys, len(weeks)), np.nan)
+    if len(weeks) > 1:
+        predicted[:, 1:] = values[:, idx[:-1], idx[1:]]
+    predicted[:, 0] = 0
+    # A missing prediction repeats the previous one of the series
+    predicted = pd.DataFrame(np.where(valid, predicted, np.nan)).ffill(axis=1).fillna(0).to_numpy()
+    return keys, valid, actual, predicted
+
+def weeks_of_stock(df, start_week, num_weeks=12):
+    """
+    Actual vs. one-week-ahead predicted Weeks of Stock of one material's waterfall.
+
+    A week's actual value comes from its own snapshot, the prediction from the previous
+    week's snapshot. As in the chart: weeks missing as a column are skipped, the series
+    stops at the first week without a snapshot, a missing actual value is 0 and a missing
+    prediction repeats the previous one (0 for the first week).
+
+    Args:
+        df (pandas.DataFrame): Waterfall from extract_and_aggregate_weekly_data.
+        start_week (int): Start week of the waterfall.
+        num_weeks (int): Weeks before and after the start week.
+
+    Returns:
+        dict: weeks (labels), actual and predicted (numpy arrays aligned with weeks).
+    """
+    weeks = generate_weeks_range(start_week, num_weeks)
+    _, valid, actual, predicted = _weeks_of_stock_arrays(df, [], weeks)
+    return {
+        "weeks": [week for week, keep in zip(weeks, valid[0]) if keep],
+        "actual": actual[0][valid[0]],
+        "predicted": predicted[0][valid[0]],
+    }
+
+def weeks_of_stock_batch(results, start_week, num_weeks=12):
+    """
+    weeks_of_stock for many materials at once.
+
+    Args:
+        results (dict): (material, plant, site) -> (DataFrame, lead_value), as returned by
+            extract_and_aggregate_weekly_data_batch.
+
+    Returns:
+        dict: (material, plant, site) -> weeks / actual / predicted, as in weeks_of_stock.
+    """
+    weeks = generate_weeks_range(start_week, num_weeks)
+    frames = [frame for frame, _ in results.values()]
+
+    # Frames missing a week column skip that week, so frames are only stacked with others of the same columns
+    groups = {}
+    for position, frame in enumerate(frames):
+        groups.setdefault(tuple(frame.columns), []).append(position)
+
+    series = {}
+    for positions in groups.values():
+        # Empty frames have no series; they get the empty one below
+        positions = [position for position in positions if not frames[position].empty]
+        if not positions:
+            continue
+        stacked = pd.concat([frames[position].assign(_result=position) for position in positions], ignore_index=True)
+        keys, valid, actual, predicted = _weeks_of_stock_arrays(stacked, ["_result"], weeks)
+        for row, (position,) in enumerate(keys):
+            series[position] = {
+                "weeks": [week for week, keep in zip(weeks, valid[row]) if keep],
+                "actual": actual[row][valid[row]],
+                "predicted": predicted[row][valid[row]],
+            }
+
+    return {
+        key: series.get(position) or {"weeks": [], "actual": np.zeros(0), "predicted": np.zeros(0)}
+        for position, key in enumerate(results)
+    }
+
+def plot_stock_prediction_plotly(df, start_week, lead_time, weeks_range):
+    """Plots actual and predicted stock values over weeks (see weeks_of_stock)."""
+    if not HAS_PLOTLY:
+        raise ImportError("plotly is required to draw the Weeks of Stock chart; use weeks_of_stock for the data")
+
+    series = weeks_of_stock(df, start_week, weeks_range)
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=series["weeks"], y=series["actual"], mode='lines+markers', name='Actual Weeks of Stock'))
+    fig.add_trace(go.Scatter(x=series["weeks"], y=series["predicted"], mode='lines+markers', name='Predicted Weeks of Stock'))
 
     fig.update_layout(title='Actual vs. Predicted Weeks of Stock',
                       xaxis_title='Week',
                       yaxis_title='Weeks of Stock')
 
-    return actual_values, fig
+    return series["actual"].tolist(), fig
 
 def check_wos_against_lead_time(wos_list, lead_time):
     """
@@ -257,43 +511,184 @@ def check_wos_against_lead_time(wos_list, lead_time):
 
     return messages, order_immediately
 
+def _cached_result(kind, folder_path, material_number, plant, site, start_week, num_weeks, compute):
+    if not os.path.exists(folder_path):
+        logger.error(f"Folder '{folder_path}' not found.")
+        return None
+    store = get_snapshot_store(folder_path)
+    return store.cached(kind, (material_number, plant, site, start_week, num_weeks), material_number, start_week, num_weeks, compute)
+
+def waterfall_chart(folder_path, material_number, plant, site, start_week, num_weeks=12):
+    """
+    Actual vs. predicted Weeks of Stock chart of one material, cached until a week it reads changes.
+
+    Returns:
+        tuple: (actual_values, fig) from plot_stock_prediction_plotly, or None if no data is found.
+    """
+    def compute():
+        result = extract_and_aggregate_weekly_data(folder_path, material_number, plant, site, start_week, num_weeks)
+        if result is None:
+            return None
+        df, lead_value = result
+        return plot_stock_prediction_plotly(df, start_week, lead_value, num_weeks)
+
+    return _cached_result("chart", folder_path, material_number, plant, site, start_week, num_weeks, compute)
+
+def waterfall_alerts(folder_path, material_number, plant, site, start_week, num_weeks=12):
+    """
+    Lead time alerts of one material's Weeks of Stock, cached until a week they read changes.
+
+    Returns:
+        tuple: (messages, order_immediately) from check_wos_against_lead_time, or None if no data is found.
+    """
+    def compute():
+        result = extract_and_aggregate_weekly_data(folder_path, material_number, plant, site, start_week, num_weeks)
+        if result is None:
+            return None
+        df, lead_value = result
+        return check_wos_against_lead_time(weeks_of_stock(df, start_week, num_weeks)["actual"].tolist(), lead_value)
+
+    return _cached_result("alerts", folder_path, material_number, plant, site, start_week, num_weeks, compute)
+
+# Weeks of Stock colors of the waterfall report
+REPORT_COLORS = {"red": "FF0000", "yellow": "FFFF00", "green": "00FF00"}
+REPORT_CHUNK_ROWS = 10_000
+SHEET_NAME_INVALID = re.compile(r"[\[\]:*?/\\]")
+
+def report_sheet_name(key, used=()):
+    """Excel-safe, unique sheet name (31 characters at most) for a waterfall key, e.g. (material, plant, site)."""
+    name = SHEET_NAME_INVALID.sub("_", "_".join(str(part) for part in key) if isinstance(key, tuple) else str(key))[:31] or "Sheet"
+    candidate, suffix = name, 1
+    while candidate.lower() in used:
+        suffix += 1
+        candidate = f"{name[:31 - len(str(suffix)) - 1]}~{suffix}"
+    return candidate
+
+def _lead_time_value(lead_time):
+    if isinstance(lead_time, pd.Series):
+        lead_time = lead_time.iloc[0] if not lead_time.empty else None
+    try:
+        value = float(lead_time)
+    except (TypeError, ValueError):
+        return None
+    # A missing (NaN) lead time colors nothing yellow, as no cell compares below it
+    return value if np.isfinite(value) else None
+
+def _waterfall_rows(df):
+    """The rows of df as lists of native Python values, missing cells as None."""
+    for start in range(0, len(df), REPORT_CHUNK_ROWS):
+        chunk = df.iloc[start:start + REPORT_CHUNK_ROWS]
+        yield from chunk.astype(object).where(chunk.notna(), None).to_numpy().tolist()
+
+def _coloring_rules(columns, n_rows, lead_time):
+    """
+    Conditional formatting of a waterfall sheet: the week block and its (color, formula) rules.
+
+    The rules are evaluated by Excel, first match wins: only numeric 'Weeks of Stock' cells
+    of the WW columns are colored, red below 0, yellow below the lead time, green otherwise.
+
+    Returns:
+        tuple: (range, rules), or None when the sheet has nothing to color.
+    """
+    week_columns = [position + 1 for position, col in enumerate(columns) if col.startswith("WW")]
+    if "Measures" not in columns or not week_columns or n_rows == 0:
+        return None
+    measures = f"${get_column_letter(columns.index('Measures') + 1)}2"
+    first = f"{get_column_letter(min(week_columns))}2"
+    is_stock = f'{measures}="Weeks of Stock",ISNUMBER({first})'
+    block = f"{get_column_letter(min(week_columns))}2:{get_column_letter(max(week_columns))}{n_rows + 1}"
+    lead_value = _lead_time_value(lead_time)
+    rules = [("red", f"AND({is_stock},{first}<0)")]
+    if lead_value is not None:
+        # repr keeps every digit of the lead time (":g" would round it to 6 significant digits)
+        rules.append(("yellow", f"AND({is_stock},{first}<{lead_value!r})"))
+    rules.append(("green", f"AND({is_stock})"))
+    return block, rules
+
+def _write_report_xlsxwriter(output, sheets):
+    workbook = xlsxwriter.Workbook(output, {
+        "constant_memory": True,
+        "strings_to_formulas": False,
+        "strings_to_urls": False,
+        "default_date_format": "yyyy-mm-dd",
+    })
+    try:
+        fills = {color: workbook.add_format({"bg_color": f"#{rgb}"}) for color, rgb in REPORT_COLORS.items()}
+        for name, df, lead_time in sheets:
+            worksheet = workbook.add_worksheet(name)
+            columns = [str(col) for col in df.columns]
+            worksheet.write_row(0, 0, columns)
+            for row_number, row in enumerate(_waterfall_rows(df), start=1):
+                worksheet.write_row(row_number, 0, row)
+            coloring = _coloring_rules(columns, len(df), lead_time)
+            if coloring:
+                block, rules = coloring
+                for color, formula in rules:
+                    worksheet.conditional_format(block, {"type": "formula", "criteria": f"={formula}", "format": fills[color], "stop_if_true": True})
+    finally:
+        workbook.close()
+
+def _write_report_openpyxl(output, sheets):
+    workbook = Workbook(write_only=True)
+    fills = {color: PatternFill(start_color=rgb, end_color=rgb, fill_type="solid") for color, rgb in REPORT_COLORS.items()}
+    for name, df, lead_time in sheets:
+        worksheet = workbook.create_sheet(name)
+        columns = [str(col) for col in df.columns]
+        worksheet.append(columns)
+        for row in _waterfall_rows(df):
+            worksheet.append(row)
+        coloring = _coloring_rules(columns, len(df), lead_time)
+        if coloring:
+            block, rules = coloring
+            for color, formula in rules:
+                worksheet.conditional_formatting.add(block, FormulaRule(formula=[formula], fill=fills[color], stopIfTrue=True))
+    if not workbook.worksheets:
+        workbook.create_sheet("Sheet1")
+    workbook.save(output)
+
+def write_waterfall_report(output, waterfalls):
+    """
+    Writes waterfalls to an Excel workbook in one pass, one sheet per waterfall.
+
+    Rows are streamed to the file (xlsxwriter's constant-memory mode, or openpyxl's
+    write-only mode when xlsxwriter is not installed). Weeks of Stock cells are colored
+    by conditional formatting rules declared once per sheet instead of per-cell fills:
+    red below 0, yellow below the lead time, green otherwise.
+
+    Args:
+        output: Path or binary file-like object to write to.
+        waterfalls: Iterable of (key, DataFrame, lead_time), e.g. from
+            ((key, df, lead) for key, (df, lead) in results.items()). The key names the sheet.
+
+    Returns:
+        list: The sheet names, in order.
+    """
+    names = []
+
+    def sheets():
+        for key, df, lead_time in waterfalls:
+            name = report_sheet_name(key, {used.lower() for used in names})
+            names.append(name)
+            yield name, df, lead_time
+        if not names:
+            yield "Sheet1", pd.DataFrame(), None
+
+    if HAS_XLSXWRITER:
+        _write_report_xlsxwriter(output, sheets())
+    else:
+        _write_report_openpyxl(output, sheets())
+    return names
+
 def apply_coloring_to_output(excel_buffer, lead_time):
-    # Rewind buffer and load workbook
-    excel_buffer.seek(0)
-    wb = load_workbook(excel_buffer)
-    ws = wb['Sheet1']
-
-    # Define colors
-    red_fill = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-    yellow_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-    green_fill = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-
-    # Identify relevant columns
-    header = [cell.value for cell in next(ws.iter_rows(min_row=1, max_row=1))]
-    measures_col_idx = header.index('Measures') + 1
-    ww_col_indices = [i + 1 for i, h in enumerate(header) if str(h).startswith("WW")]
-
-    # Apply coloring logic
-    for row in ws.iter_rows(min_row=2, max_row=ws.max_row):
-        if row[measures_col_idx - 1].value == 'Weeks of Stock':
-            for idx in ww_col_indices:
-                cell = row[idx - 1]
-                raw_val = cell.value
-                try:
-                    val = float(raw_val)
-                except (TypeError, ValueError):
-                    continue  # Skip non-numeric
-
-                
-                if val < 0:
-                    cell.fill = red_fill
-                if val < lead_time.iloc[0]:
-                    cell.fill = yellow_fill
-                else:
-                    cell.fill = green_fill
+    """
+    Colors the Weeks of Stock cells of a waterfall workbook (see write_waterfall_report).
 
-    # Save again to a new BytesIO
+    Kept for callers holding an Excel buffer; with the DataFrame at hand, call
+    write_waterfall_report directly and skip writing and re-reading the workbook.
+    """
+    excel_buffer.seek(0)
+    df = read_excel(excel_buffer, sheet_name="Sheet1")
     colored_output = BytesIO()
-    wb.save(colored_output)
+    write_waterfall_report(colored_output, [("Sheet1", df, lead_time)])
     colored_output.seek(0)
-    return colored_output
\ No newline at end of file
+    return colored_output
@@ -0,0 +1,284 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import aiohttp
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+# Source of the waterfall JSON; point it at a local server to test the cache
+WATERFALL_JSON_URL = config("WATERFALL_JSON_URL", default="https://storage.googleapis.com/babono_bucket/uploadedData.json")
+WATERFALL_CACHE_DIR = config("WATERFALL_CACHE_DIR", default=os.path.join(tempfile.gettempdir(), "capstone_waterfall_cache"))
+# A cached copy validated less than this many seconds ago is served without asking upstream
+WATERFALL_REVALIDATE_SECONDS = config("WATERFALL_REVALIDATE_SECONDS", default=60, cast=int)
+# Size of the shared aiohttp connection pool
+HTTP_POOL_SIZE = config("HTTP_POOL_SIZE", default=20, cast=int)
+HTTP_TIMEOUT_SECONDS = config("HTTP_TIMEOUT_SECONDS", default=300, cast=int)
+
+CHUNK_SIZE = 64 * 1024
+
+_http_session = None
+
+def open_http_session():
+    """Creates the shared aiohttp session (connection pool). Called from the app lifespan."""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        connector = aiohttp.TCPConnector(limit=HTTP_POOL_SIZE, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT_SECONDS, sock_connect=10)
+        _http_session = aiohttp.ClientSession(connector=connector, timeout=timeout, auto_decompress=True)
+    return _http_session
+
+async def close_http_session():
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+
+def get_http_session():
+    """The shared session, created on first use when the app runs without lifespan events."""
+    return open_http_session()
+
+class WaterfallCache:
+    """
+    On-disk copy of a remote JSON object, revalidated with ETag / Last-Modified.
+
+    Files in cache_dir, named after a hash of the URL:
+        <key>.json       the last complete download
+        <key>.json.gz    gzip copy of it, served to clients that accept gzip
+        <key>.part       an interrupted download, resumed with a Range request
+        <key>.meta.json  validators (etag, last_modified) and the time of the last check
+    """
+
+    def __init__(self, url=WATERFALL_JSON_URL, cache_dir=WATERFALL_CACHE_DIR, revalidate_seconds=WATERFALL_REVALIDATE_SECONDS):
+        self.url = url
+        self.cache_dir = cache_dir
+        self.revalidate_seconds = revalidate_seconds
+        key = hashlib.sha1(url.encode()).hexdigest()[:16]
+        self.data_path = os.path.join(cache_dir, f"{key}.json")
+        self.gzip_path = self.data_path + ".gz"
+        self.part_path = os.path.join(cache_dir, f"{key}.part")
+        self.meta_path = os.path.join(cache_dir, f"{key}.meta.json")
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.downloads = 0
+        self.resumed = 0
+
+    def load_meta(self):
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_meta(self, meta):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def is_cached(self):
+        return os.path.exists(self.data_path)
+
+    def is_fresh(self):
+        """True when the cached copy was validated within revalidate_seconds."""
+        if not self.is_cached():
+            return False
+        return time.time() - self.load_meta().get("checked_at", 0) < self.revalidate_seconds
+
+    def has_gzip(self):
+        return os.path.exists(self.gzip_path)
+
+    async def iter_file(self, path, start=0):
+        """Reads a cached file in chunks without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        with open(path, "rb") as f:
+            f.seek(start)
+            while True:
+                chunk = await loop.run_in_executor(None, f.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    def _conditional_headers(self, meta):
+        """Request headers: resume the partial download if there is one, else revalidate the cached copy."""
+        headers = {}
+        if os.path.exists(self.part_path) and meta.get("part_etag"):
+            # Byte ranges refer to the stored representation, so ask for it uncompressed
+            headers["Range"] = f"bytes={os.path.getsize(self.part_path)}-"
+            headers["If-Range"] = meta["part_etag"]
+            headers["Accept-Encoding"] = "identity"
+        elif self.is_cached():
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def _part_complete(self, meta):
+        """True when the .part file already holds the whole object (the download was never finalized)."""
+        length = meta.get("part_length")
+        return length is not None and os.path.exists(self.part_path) and os.path.getsize(self.part_path) == length
+
+    def _discard_part(self, meta):
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+        for field in ("part_etag", "part_length", "part_last_modified"):
+            meta.pop(field, None)
+        self._save_meta(meta)
+
+    def _finish_download(self, meta, etag, last_modified):
+        os.replace(self.part_path, self.data_path)
+        tmp_path = self.gzip_path + ".tmp"
+        with open(self.data_path, "rb") as src, gzip.open(tmp_path, "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        os.replace(tmp_path, self.gzip_path)
+        for field in ("part_etag", "part_length", "part_last_modified"):
+            meta.pop(field, None)
+        meta.update(etag=etag, last_modified=last_modified, checked_at=time.time(), size=os.path.getsize(self.data_path))
+        self._save_meta(meta)
+
+    async def _open_upstream(self, session):
+        """
+        Asks upstream for the object. Called with the lock held.
+
+        Returns:
+            tuple: (response, meta) when a body has to be downloaded, or None when the
+            cached copy is to be served (finalized .part, 304, or upstream unreachable).
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        meta = self.load_meta()
+        loop = asyncio.get_running_loop()
+        if self._part_complete(meta):
+            logger.info(f"Finalizing the complete partial download of {self.url}")
+            await loop.run_in_executor(None, self._finish_download, meta, meta.get("part_etag"), meta.get("part_last_modified"))
+            return None
+
+        while True:
+            headers = self._conditional_headers(meta)
+            try:
+                response = await session.get(self.url, headers=headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if not self.is_cached():
+                    raise
+                logger.warning(f"Upstream unavailable ({e}), serving cached {self.url}")
+                self.hits += 1
+                return None
+            if response.status == 416 and "Range" in headers:
+                # The part cannot be resumed (e.g. it is already complete but of unknown length): start over
+                response.release()
+                logger.warning(f"Range {headers['Range']} of {self.url} not satisfiable, discarding the partial download")
+                self._discard_part(meta)
+                continue
+            break
+
+        if response.status == 304:
+            response.release()
+            logger.info(f"{self.url} not modified, serving from disk")
+            self.revalidated += 1
+            meta["checked_at"] = time.time()
+            self._save_meta(meta)
+            return None
+        try:
+            response.raise_for_status()
+        except aiohttp.ClientResponseError:
+            response.release()
+            raise
+        return response, meta
+
+    async def _download(self, response, meta):
+        """Writes the response body to the .part file, then finalizes it into the cached copy."""
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        # A transcoded (compressed) body cannot be resumed by byte offset
+        resumable = etag is not None and response.headers.get("Content-Encoding", "identity") == "identity"
+        if response.status == 206:
+            self.resumed += 1
+            logger.info(f"Resuming {self.url} from byte {os.path.getsize(self.part_path)}")
+            mode = "ab"
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            length = int(total) if total.isdigit() else None
+        else:
+            self.downloads += 1
+            mode = "wb"
+            length = response.content_length if resumable else None
+
+        meta.update(part_etag=etag if resumable else None, part_length=length, part_last_modified=last_modified)
+        self._save_meta(meta)
+        total_bytes = 0
+        last_logged = time.time()
+        finished = False
+        try:
+            with open(self.part_path, mode) as part:
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    part.write(chunk)
+                    total_bytes += len(chunk)
+                    if time.time() - last_logged >= 1:
+                        logger.info(f"Downloaded {total_bytes} bytes so far")
+                        last_logged = time.time()
+            finished = True
+        finally:
+            if not finished and self._part_complete(meta):
+                # Cancelled after the last chunk: keep the download instead of a part that can never resume
+                self._finish_download(meta, etag, last_modified)
+
+        logger.info(f"Downloaded {total_bytes} bytes of {self.url}")
+        await asyncio.get_running_loop().run_in_executor(None, self._finish_download, meta, etag, last_modified)
+
+    async def refresh(self, session):
+        """
+        Brings the on-disk copy up to date: revalidates it (304), or downloads the
+        object to disk. An interrupted download is kept as a .part file and resumed
+        with a Range request on the next call; a .part that already holds the whole
+        object is finalized, and one upstream will not resume (416) is discarded.
+        When upstream is unreachable a complete cached copy is kept as-is.
+
+        The lock covers only this, never a client reading the result. Fresh copies
+        skip it, and while another request downloads, callers that already have a
+        cached copy serve that instead of waiting.
+        """
+        if self.is_fresh() or (self._lock.locked() and self.is_cached()):
+            self.hits += 1
+            return
+        async with self._lock:
+            if self.is_fresh():
+                self.hits += 1
+                return
+            opened = await self._open_upstream(session)
+            if opened is not None:
+                response, meta = opened
+                async with response:
+                    await self._download(response, meta)
+
+    async def stream(self, session):
+        """Yields the object's bytes from disk after refreshing the cached copy."""
+        await self.refresh(session)
+        async for chunk in self.iter_file(self.data_path):
+            yield chunk
+
+    async def ensure_cached(self, session):
+        """Brings the on-disk copy up to date and returns its path."""
+        await self.refresh(session)
+        return self.data_path
+
+    def stats(self):
+        meta = self.load_meta()
+        return {
+            "url": self.url,
+            "cached": self.is_cached(),
+            "size": meta.get("size"),
+            "etag": meta.get("etag"),
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "downloads": self.downloads,
+            "resumed": self.resumed,
+        }
+
+waterfall_cache = WaterfallCache()
@@ -0,0 +1,271 @@
+import codecs
+import json
+import logging
+import os
+import re
+import threading
+import time
+import pandas as pd
+from api.filter_engine import FilterIndex
+
+logger = logging.getLogger(__name__)
+
+# Record fields kept in the side index; the filters of the waterfall query map onto them
+INDEX_FIELDS = ["Material Number", "Plant", "Site", "Measures"]
+WEEK_COLUMN = "Snapshot"
+# Bump when the stored index layout or key normalization changes, so stored indexes are rebuilt
+INDEX_VERSION = 2
+QUERY_FIELDS = {"material": "Material Number", "plant": "Plant", "site": "Site", "measures": "Measures", "week": WEEK_COLUMN}
+
+WEEKS_PER_YEAR = 52
+READ_SIZE = 1024 * 1024
+WHITESPACE = " \t\r\n"
+
+_decoder = json.JSONDecoder()
+
+def key_text(value):
+    """Text form of a key value, so 1234, 1234.0 and "1234" all compare equal as "1234"."""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def week_label(position):
+    """Snapshot label of the position-th weekly group, as the dashboard names them (0 -> WW01)."""
+    return f"WW{position + 1:02d}"
+
+def week_window(start_week, num_weeks):
+    """Snapshots from start_week - num_weeks to start_week, wrapping around the year like the dashboard."""
+    start = int(str(start_week).upper().replace("WW", ""))
+    return [week_label((start + offset - 1) % WEEKS_PER_YEAR) for offset in range(-num_weeks, 1)]
+
+def _group_label(key, position):
+    # ZIP uploads are keyed by member name (e.g. "WW05.xlsx"), arrays by position
+    if key is None:
+        return week_label(position)
+    match = re.search(r"WW\s*(\d+)", key, re.IGNORECASE)
+    return f"WW{int(match.group(1)):02d}" if match else key
+
+class _Scanner:
+    """
+    Incremental tokenizer over a JSON file that tracks the byte offset of every value.
+
+    Only the structural characters around records are handled here; each record is
+    decoded by json's C raw_decode, so the whole document is never held in memory.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.offset = 0  # byte offset of buf[pos]
+        self.eof = False
+
+    def _fill(self):
+        if self.eof:
+            return False
+        if self.pos > len(self.buf) // 2:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        data = self.f.read(READ_SIZE)
+        self.eof = not data
+        self.buf += self.decoder.decode(data, final=self.eof)
+        return bool(data)
+
+    def _advance(self, end):
+        self.offset += len(self.buf[self.pos:end].encode("utf-8"))
+        self.pos = end
+
+    def peek(self):
+        """Skips whitespace and returns the next character without consuming it ('' at EOF)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+                self.offset += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars):
+        char = self.peek()
+        if char == "" or char not in chars:
+            raise ValueError(f"Malformed waterfall JSON at byte {self.offset}: expected one of {chars!r}, got {char!r}")
+        self.pos += 1
+        self.offset += 1
+        return char
+
+    def value(self):
+        """Decodes the next JSON value, returning (value, byte offset, byte length)."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                # A number may continue in the next block
+                if end < len(self.buf) or self.eof or not isinstance(value, (int, float)):
+                    break
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise ValueError(f"Malformed waterfall JSON at byte {self.offset}") from None
+            self._fill()
+        start = self.offset
+        self._advance(end)
+        return value, start, self.offset - start
+
+    def items(self, closing):
+        """Yields the elements of the array or object whose opening bracket was just consumed."""
+        if self.peek() == closing:
+            self.expect(closing)
+            return
+        while True:
+            if closing == "}":
+                key, _, _ = self.value()
+                self.expect(":")
+                yield key
+            else:
+                yield None
+            if self.expect("," + closing) == closing:
+                return
+
+def scan_records(f):
+    """
+    Parses a waterfall JSON document incrementally.
+
+    Accepts the bucket layout (an array with one array of records per week), a
+    ZIP upload response (an object of member name -> records) or a flat array of records.
+
+    Yields:
+        tuple: (snapshot, record dict, byte offset, byte length) for every record.
+    """
+    scanner = _Scanner(f)
+    opening = scanner.expect("[{")
+    for position, key in enumerate(scanner.items("]" if opening == "[" else "}")):
+        if scanner.peek() == "[":
+            label = _group_label(key, position)
+            scanner.expect("[")
+            for _ in scanner.items("]"):
+                record, offset, length = scanner.value()
+                yield label, record, offset, length
+        else:
+            record, offset, length = scanner.value()
+            if isinstance(record, dict):
+                yield record.get(WEEK_COLUMN, ""), record, offset, length
+
+def file_fingerprint(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+class WaterfallIndex:
+    """
+    Side index of a waterfall JSON file: the key fields and byte range of every record.
+
+    Built in one pass over the file and stored next to it as Parquet, so later
+    queries read only the matching records with a seek per record.
+    """
+
+    def __init__(self, path, entries, fingerprint):
+        self.path = path
+        self.entries = entries
+        self.fingerprint = fingerprint
+        self.filter_index = FilterIndex(entries, columns=INDEX_FIELDS + [WEEK_COLUMN])
+
+    @staticmethod
+    def index_path(path, fingerprint):
+        return f"{path}.{fingerprint}.v{INDEX_VERSION}.index.parquet"
+
+    @classmethod
+    def build(cls, path):
+        started = time.perf_counter()
+        fingerprint = file_fingerprint(path)
+        columns = {field: [] for field in [WEEK_COLUMN] + INDEX_FIELDS + ["offset", "length"]}
+        with open(path, "rb") as f:
+            for label, record, offset, length in scan_records(f):
+                columns[WEEK_COLUMN].append(label)
+                for field in INDEX_FIELDS:
+                    value = record.get(field)
+                    # Normalized like the snapshot store's keys, so a material stored as 1234.0 matches 1234
+                    columns[field].append("" if value is None else key_text(value))
+                columns["offset"].append(offset)
+                columns["length"].append(length)
+        entries = pd.DataFrame(columns)
+        entries["offset"] = entries["offset"].astype("int64")
+        entries["length"] = entries["length"].astype("int64")
+        logger.info(f"Indexed {len(entries)} waterfall records of {path} in {time.perf_counter() - started:.2f}s")
+        try:
+            entries.to_parquet(cls.index_path(path, fingerprint), index=False)
+        except OSError as e:
+            logger.warning(f"Could not store the waterfall index: {e}")
+        return cls(path, entries, fingerprint)
+
+    @classmethod
+    def load(cls, path):
+        """Loads the stored index of path when it matches the file, else builds it."""
+        fingerprint = file_fingerprint(path)
+        index_path = cls.index_path(path, fingerprint)
+        if os.path.exists(index_path):
+            return cls(path, pd.read_parquet(index_path), fingerprint)
+        for name in os.listdir(os.path.dirname(path) or "."):
+            stale = os.path.join(os.path.dirname(path), name)
+            if stale.startswith(f"{path}.") and stale.endswith(".index.parquet"):
+                os.remove(stale)
+        return cls.build(path)
+
+    def is_current(self):
+        return os.path.exists(self.path) and file_fingerprint(self.path) == self.fingerprint
+
+    def query(self, filters):
+        """
+        Reads the records matching filters, in file order, with their Snapshot set.
+
+        Args:
+            filters (dict): Index field (or WEEK_COLUMN) -> value or list of values.
+
+        Returns:
+            list: Matching records.
+        """
+        rows = self.filter_index.rows(filters)
+        matches = self.entries.iloc[rows]
+        records = []
+        with open(self.path, "rb") as f:
+            for label, offset, length in zip(matches[WEEK_COLUMN], matches["offset"], matches["length"]):
+                f.seek(offset)
+                record = json.loads(f.read(length))
+                record[WEEK_COLUMN] = label
+                records.append(record)
+        return records
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index(path):
+    """The side index of path, rebuilt when the file has changed since it was indexed."""
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None or not index.is_current():
+            index = WaterfallIndex.load(path)
+            _indexes[path] = index
+        return index
+
+def build_filters(material=None, plant=None, site=None, week=None, measures=None, start_week=None, num_weeks=12):
+    """
+    Turns the query parameters of the waterfall endpoint into index filters.
+
+    Each parameter is a comma-separated list of values; start_week selects the
+    num_weeks snapshots before it, like the dashboard's waterfall window.
+    """
+    params = {"material": material, "plant": plant, "site": site, "week": week, "measures": measures}
+    filters = {}
+    for name, value in params.items():
+        if value:
+            values = [item.strip() for item in value.split(",") if item.strip()]
+            if name == "week":
+                values = [week_label(int(item) - 1) if item.isdigit() else _group_label(item, 0) for item in values]
+            filters[QUERY_FIELDS[name]] = values
+    if start_week:
+        try:
+            window = week_window(start_week, num_weeks)
+        except ValueError:
+            raise ValueError(f"Invalid start_week: {start_week}. Expected e.g. WW05") from None
+        weeks = filters.get(WEEK_COLUMN)
+        filters[WEEK_COLUMN] = [w for w in window if w in weeks] if weeks else window
+    return filters
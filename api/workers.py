@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from decouple import config
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Worker processes for CPU-heavy request work (parsing, cleaning); 0 runs it in a thread instead
+CPU_WORKERS = config("CPU_WORKERS", default=min(4, os.cpu_count() or 1), cast=int)
+# Jobs allowed to wait for a free worker; beyond that requests are turned away
+CPU_QUEUE_SIZE = config("CPU_QUEUE_SIZE", default=8, cast=int)
+# Status sent when the queue is full (503 Service Unavailable, or 429 Too Many Requests)
+CPU_QUEUE_FULL_STATUS = config("CPU_QUEUE_FULL_STATUS", default=503, cast=int)
+RETRY_AFTER_SECONDS = config("RETRY_AFTER_SECONDS", default=5, cast=int)
+# How often a waiting request checks whether its client has gone away
+DISCONNECT_POLL_SECONDS = 0.5
+
+# Status logged/recorded for requests whose client disconnected (nginx convention)
+CLIENT_CLOSED_REQUEST = 499
+
+class WorkerPool:
+    """
+    Bounded process pool for CPU-bound request work, so it never runs on the event loop.
+
+    At most max_workers jobs run at once and queue_size more may wait; further
+    submissions are rejected right away with CPU_QUEUE_FULL_STATUS and a
+    Retry-After header instead of piling up. A job whose client disconnects
+    is cancelled if it has not started yet and its result is discarded otherwise.
+    """
+
+    def __init__(self, max_workers=CPU_WORKERS, queue_size=CPU_QUEUE_SIZE):
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self._executor = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.cancelled = 0
+
+    def executor(self):
+        if self._executor is None:
+            if self.max_workers > 0:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=1)
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _reserve(self):
+        with self._lock:
+            if self.in_flight >= max(self.max_workers, 1) + self.queue_size:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def _release(self, _future):
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+
+    async def run(self, func, *args, request=None):
+        """
+        Runs func(*args) in a worker process and returns its result.
+
+        Args:
+            func: Picklable, module-level function.
+            *args: Picklable arguments.
+            request (Request): When given, the job is abandoned as soon as the client disconnects.
+
+        Raises:
+            HTTPException: CPU_QUEUE_FULL_STATUS with Retry-After when the pool is saturated,
+                CLIENT_CLOSED_REQUEST when the client went away while waiting.
+        """
+        if not self._reserve():
+            logger.warning(f"Worker pool saturated ({self.in_flight} jobs in flight), rejecting {func.__name__}")
+            raise HTTPException(
+                status_code=CPU_QUEUE_FULL_STATUS,
+                detail="The server is busy processing other files. Please retry shortly.",
+                headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+            )
+
+        try:
+            job = self.executor().submit(func, *args)
+        except Exception:
+            self._release(None)
+            raise
+        # Capacity is given back when the job itself ends, not when its request gives up on it
+        job.add_done_callback(self._release)
+        future = asyncio.wrap_future(job)
+        if request is None:
+            return await future
+
+        watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+        try:
+            done, _ = await asyncio.wait({future, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            watcher.cancel()
+        if future not in done:
+            job.cancel()
+            with self._lock:
+                self.cancelled += 1
+            logger.info(f"Client disconnected, abandoned {func.__name__}")
+            raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
+        return future.result()
+
+    def stats(self):
+        return {
+            "workers": self.max_workers,
+            "queue_size": self.queue_size,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+        }
+
+async def _wait_for_disconnect(request):
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+cpu_pool = WorkerPool()
@@ -0,0 +1,99 @@
+import asyncio
+import io
+import logging
+import time
+import zipfile
+from api.excel_reader import read_excel
+from api.responses import dataframe_json_bytes
+from api.uploads import ZipLimitError, check_zip_limits
+from api.workers import cpu_pool
+
+logger = logging.getLogger(__name__)
+
+def parse_zip_member(archive_path, filename):
+    """
+    Parses one XLSX member of a shortage ZIP. Runs in a worker process.
+
+    The member is decompressed here rather than in the request process, so its bytes
+    are never pickled between processes. Being a ZIP itself, the workbook is checked
+    against the decompression limits before it is opened.
+
+    Returns:
+        dict: filename, records_json (JSON array of the rows, NaN as ""), plus row count, size and parse time for logging.
+    """
+    started = time.perf_counter()
+    with zipfile.ZipFile(archive_path, "r") as zip_archive:
+        payload = zip_archive.read(filename)
+    try:
+        check_zip_limits(io.BytesIO(payload))
+        df = read_excel(io.BytesIO(payload))
+    except ZipLimitError as e:
+        raise ZipLimitError(f"{filename}: {e}") from None
+    except Exception as e:
+        raise RuntimeError(f"Error reading {filename}: {e}") from None
+
+    # Serialize here, in the worker, with NaN values as empty strings
+    return {
+        "filename": filename,
+        "records_json": dataframe_json_bytes(df, na_value=""),
+        "rows": len(df),
+        "bytes": len(payload),
+        "seconds": time.perf_counter() - started,
+    }
+
+async def parse_zip_members(archive_path):
+    """
+    Parses the .xlsx members of a ZIP archive concurrently, yielding each result as soon as it is done.
+
+    Members are submitted to the shared api.workers.cpu_pool, so ZIP parsing counts
+    against its admission control (CPU_QUEUE_FULL_STATUS when saturated) like any other
+    upload. At most one member per worker is in flight, each decompressed by its worker,
+    so only a bounded number of decompressed members is held in memory and other requests
+    still find room in the queue. The archive should have been checked with
+    api.uploads.check_zip_limits (spool_upload does so).
+
+    Args:
+        archive_path (str): Path of the ZIP archive, e.g. a spooled upload.
+
+    Yields:
+        dict: Result of parse_zip_member plus the member's position in the archive, in completion order.
+
+    Raises:
+        HTTPException: From cpu_pool.run when the worker pool is saturated.
+    """
+    max_in_flight = max(cpu_pool.max_workers, 1)
+    pending = set()
+    positions = {}
+    started = time.perf_counter()
+
+    def log_result(future):
+        result = future.result()
+        result["position"] = positions.pop(future)
+        logger.info(
+            f"Parsed {result['filename']}: {result['rows']} rows, {result['bytes']} bytes in {result['seconds']:.2f}s"
+        )
+        return result
+
+    try:
+        with zipfile.ZipFile(archive_path, "r") as zip_archive:
+            names = zip_archive.namelist()
+        for position, filename in enumerate(names):
+            if not filename.lower().endswith(".xlsx"):
+                continue
+            future = asyncio.ensure_future(cpu_pool.run(parse_zip_member, archive_path, filename))
+            positions[future] = position
+            pending.add(future)
+            if len(pending) >= max_in_flight:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    yield log_result(future)
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                yield log_result(future)
+    finally:
+        for future in pending:
+            future.cancel()
+
+    logger.info(f"Parsed ZIP archive in {time.perf_counter() - started:.2f}s")
@@ -104,6 +104,8 @@ export const useFileUpload = ({ type, onDataRetrieved }: UseFileUploadProps) =>
     accept: {
       "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": [".xlsx"],
       "application/vnd.ms-excel": [".xls"],
+      "text/csv": [".csv"],
+      "application/vnd.apache.parquet": [".parquet"],
       "application/zip": [".zip"],
     },
     multiple: false,
@@ -0,0 +1,363 @@
+"""
+Times every endpoint of api/index.py, extract_and_aggregate_weekly_data and the
+forecast functions on synthetic data, across scale tiers (see benchmarks.synthetic_data).
+
+Each tier runs in a fresh process with its own parse / waterfall caches, and the
+waterfall JSON is served from a local HTTP server. Results are written as JSON;
+with --compare, cases slower than the baseline by more than --tolerance are
+reported and the exit status is 1.
+
+Run from the repository root:
+    python -m benchmarks.bench_api --tiers small medium --repeat 3 --output bench_api.json
+    python -m benchmarks.bench_api --tiers small --compare bench_api.json
+"""
+import argparse
+import functools
+import http.server
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from benchmarks.synthetic_data import SCALES, external_consumption, load_or_generate
+
+DEFAULT_WORKDIR = os.path.join(tempfile.gettempdir(), "capstone_bench")
+# Seconds a forecast job may take before the benchmark gives up on it
+JOB_TIMEOUT_SECONDS = 600
+
+# name -> takes an external (Year / Week / Consumption) DataFrame
+FORECAST_FUNCTIONS = {
+    "forecast_weekly_consumption_xgboost": False,
+    "forecast_weekly_consumption_xgboost_plotly": False,
+    "forecast_weekly_consumption_xgboost_v2": False,
+    "forecast_weekly_consumption_xgboost_v3": True,
+    "forecast_weekly_consumption_arima": False,
+    "forecast_weekly_consumption_arima_plotly": False,
+    "forecast_weekly_consumption_arima_v2": True,
+}
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+def serve_directory(directory):
+    """Serves directory over HTTP on a free local port; returns the server (shut down by the caller)."""
+    handler = functools.partial(QuietHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def summarize(group, name, runs, status="ok", detail=None):
+    """One report entry; the first run is the cold one (empty caches), the rest are warm."""
+    seconds = [run["seconds"] for run in runs]
+    entry = {"group": group, "name": name, "status": status, "runs": len(runs)}
+    if seconds:
+        entry.update({
+            "cold_seconds": round(seconds[0], 4),
+            "best_seconds": round(min(seconds), 4),
+            "median_seconds": round(statistics.median(seconds), 4),
+            "warm_seconds": round(min(seconds[1:]), 4) if len(seconds) > 1 else None,
+        })
+    for key in ("http_status", "response_bytes", "rows"):
+        if runs and key in runs[-1]:
+            entry[key] = runs[-1][key]
+    if detail:
+        entry["detail"] = detail
+    return entry
+
+class EndpointBench:
+    """Sends the benchmark requests through the ASGI app in-process (FastAPI's TestClient)."""
+
+    def __init__(self, client, repeat):
+        self.client = client
+        self.repeat = repeat
+        self.results = []
+
+    def request(self, method, path, files=None, **kwargs):
+        """Times one request. files maps the form field to (filename, path) and is re-read from disk per run."""
+        if files:
+            kwargs["files"] = {field: (filename, open(file_path, "rb")) for field, (filename, file_path) in files.items()}
+        started = time.perf_counter()
+        try:
+            response = self.client.request(method, path, **kwargs)
+        finally:
+            for _, handle in (kwargs.get("files") or {}).values():
+                handle.close()
+        return response, {"seconds": time.perf_counter() - started, "http_status": response.status_code, "response_bytes": len(response.content)}
+
+    def case(self, name, method, path, repeat=None, expected_status=None, **kwargs):
+        runs = []
+        response = None
+        for _ in range(repeat or self.repeat):
+            response, run = self.request(method, path, **kwargs)
+            runs.append(run)
+        status = "ok" if response.status_code < 400 or response.status_code == expected_status else "error"
+        detail = None if status == "ok" else response.text[:300]
+        self.results.append(summarize("endpoint", name, runs, status, detail))
+        print(f"  {name:<52} {runs[0]['seconds']:8.3f}s  HTTP {response.status_code}")
+        return response
+
+def bench_endpoints(client, manifest, repeat):
+    files = manifest["files"]
+    sample = manifest["sample"]
+    weeks = manifest["weeks"]
+    bench = EndpointBench(client, repeat)
+
+    bench.case("GET helloFastApi", "GET", "/api/py/helloFastApi")
+
+    consumption = bench.case(
+        "POST uploadExcelMaterialConsumption (xlsx)", "POST", "/api/py/uploadExcelMaterialConsumption",
+        files={"file": ("material_consumption.xlsx", files["material_consumption.xlsx"])},
+    )
+    bench.case(
+        "POST uploadExcelMaterialConsumption (csv)", "POST", "/api/py/uploadExcelMaterialConsumption",
+        files={"file": ("material_consumption.csv", files["material_consumption.csv"])},
+    )
+    bench.case(
+        "POST uploadExcelMaterialConsumption (csv, arrow)", "POST", "/api/py/uploadExcelMaterialConsumption",
+        files={"file": ("material_consumption.csv", files["material_consumption.csv"])},
+        headers={"Accept": "application/vnd.apache.arrow.stream"},
+    )
+    bench.case(
+        "POST uploadExcelMaterialConsumption (xlsx, stream)", "POST", "/api/py/uploadExcelMaterialConsumption?stream=true",
+        files={"file": ("material_consumption.xlsx", files["material_consumption.xlsx"])},
+    )
+    bench.case(
+        "POST uploadExcelOrderPlacement (xlsx)", "POST", "/api/py/uploadExcelOrderPlacement",
+        files={"file": ("order_placement.xlsx", files["order_placement.xlsx"])},
+    )
+    bench.case(
+        "POST uploadExcelGoodsReceipt (xlsx)", "POST", "/api/py/uploadExcelGoodsReceipt",
+        files={"file": ("goods_receipt.xlsx", files["goods_receipt.xlsx"])},
+    )
+
+    dataset_id = consumption.headers.get("X-Dataset-Id")
+    if dataset_id:
+        bench.case("GET datasets/{dataset_id}", "GET", f"/api/py/datasets/{dataset_id}")
+        filters = {"plants": [sample["plant"]], "date_from": "2024-03-01", "date_to": "2024-09-30"}
+        bench.case("POST filter (dataset_id)", "POST", f"/api/py/filter/?dataset_id={dataset_id}", json={"filters": filters})
+        bench.case("POST visualization (dataset_id)", "POST", f"/api/py/visualization/?dataset_id={dataset_id}")
+        query = {"group_by": ["material", "month"], "metrics": ["count", "sum", "mean"], "top_k": 10}
+        bench.case("POST aggregate (dataset_id)", "POST", f"/api/py/aggregate/?dataset_id={dataset_id}", json={"query": query})
+
+    bench.case(
+        "POST uploadShortageZip", "POST", "/api/py/uploadShortageZip",
+        files={"file": ("shortage.zip", files["shortage.zip"])},
+    )
+    bench.case(
+        "POST uploadShortageZip (stream)", "POST", "/api/py/uploadShortageZip?stream=true",
+        files={"file": ("shortage.zip", files["shortage.zip"])},
+    )
+    bench.case(
+        "POST uploadShortageXlsx", "POST", "/api/py/uploadShortageXlsx",
+        files={"file": (f"WW{weeks}.xlsx", os.path.join(files["shortage_dir"], f"WW{weeks}.xlsx"))},
+    )
+
+    bench.case("GET fetchWaterfallJson", "GET", "/api/py/fetchWaterfallJson")
+    bench.case("GET fetchWaterfallJson (gzip)", "GET", "/api/py/fetchWaterfallJson", headers={"Accept-Encoding": "gzip"})
+    params = {"material": sample["material"], "plant": sample["plant"], "site": sample["site"], "start_week": f"WW{weeks:02d}"}
+    bench.case("GET waterfall/records", "GET", "/api/py/waterfall/records", params=params)
+    bench.case("GET waterfallCache/stats", "GET", "/api/py/waterfallCache/stats")
+
+    job = bench_forecast_job(bench, dataset_id, sample["material"])
+    if job is not None:
+        bench.case("GET jobs/{job_id}", "GET", f"/api/py/jobs/{job}")
+        bench.case("GET jobs/{job_id}/stream", "GET", f"/api/py/jobs/{job}/stream", repeat=1)
+        # Finished jobs cannot be cancelled; this times the lookup and the 409
+        bench.case("DELETE jobs/{job_id}", "DELETE", f"/api/py/jobs/{job}", repeat=1, expected_status=409)
+
+    bench.case("GET cache/stats", "GET", "/api/py/cache/stats")
+    bench.case("GET metrics", "GET", "/api/py/metrics")
+    if dataset_id:
+        bench.case("DELETE datasets/{dataset_id}", "DELETE", f"/api/py/datasets/{dataset_id}", repeat=1)
+    return bench.results
+
+def bench_forecast_job(bench, dataset_id, material):
+    """Submits a forecast job and times it until it finishes (submit + queue + model run)."""
+    if not dataset_id:
+        return None
+    body = {"material": material, "model": "xgboost", "horizon": 6}
+    response, run = bench.request("POST", f"/api/py/jobs/forecast?dataset_id={dataset_id}", json=body)
+    if response.status_code >= 400:
+        bench.results.append(summarize("endpoint", "POST jobs/forecast (until finished)", [run], "error", response.text[:300]))
+        return None
+    job_id = response.json()["job_id"]
+    started = time.perf_counter() - run["seconds"]
+    status = response.json()
+    while status["status"] not in ("succeeded", "failed", "cancelled") and time.perf_counter() - started < JOB_TIMEOUT_SECONDS:
+        time.sleep(0.05)
+        status = bench.client.get(f"/api/py/jobs/{job_id}").json()
+    run["seconds"] = time.perf_counter() - started
+    outcome = "ok" if status["status"] == "succeeded" else "error"
+    bench.results.append(summarize("endpoint", "POST jobs/forecast (until finished)", [run], outcome, status.get("error")))
+    print(f"  {'POST jobs/forecast (until finished)':<52} {run['seconds']:8.3f}s  {status['status']}")
+    return job_id
+
+def time_function(name, func, repeat):
+    runs = []
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            run = {"seconds": time.perf_counter() - started}
+            if hasattr(result, "__len__"):
+                run["rows"] = len(result)
+            runs.append(run)
+    except ImportError as e:
+        print(f"  {name:<52} skipped ({e})")
+        return summarize("function", name, [], "skipped", f"Missing dependency: {e}")
+    except Exception as e:
+        print(f"  {name:<52} error ({type(e).__name__}: {e})")
+        return summarize("function", name, runs, "error", f"{type(e).__name__}: {e}")
+    print(f"  {name:<52} {runs[0]['seconds']:8.3f}s")
+    return summarize("function", name, runs)
+
+def bench_functions(manifest, repeat):
+    import pandas as pd
+
+    files = manifest["files"]
+    sample = manifest["sample"]
+    weeks = manifest["weeks"]
+    results = []
+
+    def waterfall():
+        from api.waterfall_analysis import extract_and_aggregate_weekly_data
+        result = extract_and_aggregate_weekly_data(
+            files["shortage_dir"], sample["material"], sample["plant"], sample["site"], weeks, min(12, weeks - 1)
+        )
+        if result is None:
+            raise RuntimeError("No data found")
+        return result[0]
+
+    results.append(time_function("extract_and_aggregate_weekly_data", waterfall, repeat))
+
+    wide = pd.read_excel(files["consumption_wide.xlsx"])
+    material_df = wide[wide["Material Number"] == sample["material"]].reset_index(drop=True)
+    external = external_consumption(material_df.iloc[0, 1:].to_numpy())
+
+    def forecast(name, with_external):
+        import matplotlib
+        matplotlib.use("Agg")
+        from api import forecast_models
+        func = getattr(forecast_models, name)
+        args = (material_df.copy(), external.copy()) if with_external else (material_df.copy(),)
+        result = func(*args, forecast_weeks_ahead=6)
+        return result[0] if isinstance(result, tuple) else result
+
+    for name, with_external in FORECAST_FUNCTIONS.items():
+        results.append(time_function(name, functools.partial(forecast, name, with_external), repeat))
+    return results
+
+def environment():
+    import numpy
+    import pandas
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=False).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pandas": pandas.__version__,
+        "numpy": numpy.__version__,
+        "commit": commit or None,
+    }
+
+def run_tier(tier, scale, workdir, repeat):
+    """Benchmarks one tier in this process. Must run before api.* is imported (it configures the caches)."""
+    data_dir = os.path.join(workdir, f"data_{tier}")
+    manifest = load_or_generate(data_dir, scale["materials"], scale["weeks"], scale["rows"])
+
+    server = serve_directory(data_dir)
+    cache_dir = tempfile.mkdtemp(prefix=f"bench_{tier}_", dir=workdir)
+    os.environ.update({
+        "WATERFALL_JSON_URL": f"http://127.0.0.1:{server.server_port}/waterfall.json",
+        "WATERFALL_CACHE_DIR": os.path.join(cache_dir, "waterfall"),
+        "PARSE_CACHE_DIR": os.path.join(cache_dir, "parse"),
+        "UPLOAD_SPOOL_DIR": cache_dir,
+        "MPLBACKEND": "Agg",
+    })
+    try:
+        from fastapi.testclient import TestClient
+        from api.index import app
+
+        print(f"Tier {tier}: {scale['materials']} materials x {scale['weeks']} weeks x {scale['rows']} rows")
+        with TestClient(app) as client:
+            results = bench_endpoints(client, manifest, repeat)
+        results += bench_functions(manifest, repeat)
+    finally:
+        server.shutdown()
+    for result in results:
+        result["tier"] = tier
+    return results
+
+def compare(report, baseline, tolerance):
+    """Cases whose best time regressed by more than tolerance (a fraction) against the baseline report."""
+    previous = {(r["tier"], r["name"]): r for r in baseline["results"] if r.get("status") == "ok"}
+    regressions = []
+    for result in report["results"]:
+        before = previous.get((result["tier"], result["name"]))
+        if result.get("status") != "ok" or before is None or not before.get("best_seconds"):
+            continue
+        ratio = result["best_seconds"] / before["best_seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append({"tier": result["tier"], "name": result["name"], "before": before["best_seconds"], "after": result["best_seconds"], "ratio": round(ratio, 2)})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tiers", nargs="+", choices=SCALES, default=["small", "medium"])
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the first is cold, the rest warm")
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR, help="Where generated data and caches are kept")
+    parser.add_argument("--output", help="Write the report as JSON to this path")
+    parser.add_argument("--compare", help="Baseline report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown against the baseline (0.25 = 25%%)")
+    parser.add_argument("--in-process", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    os.makedirs(args.workdir, exist_ok=True)
+
+    if args.in_process:
+        results = run_tier(args.tiers[0], SCALES[args.tiers[0]], args.workdir, args.repeat)
+        with open(args.output, "w") as f:
+            json.dump(results, f)
+        return
+
+    results = []
+    for tier in args.tiers:
+        # A fresh process per tier: empty caches, and the environment is read at import time
+        part = os.path.join(args.workdir, f"results_{tier}.json")
+        command = [sys.executable, "-m", "benchmarks.bench_api", "--in-process", "--tiers", tier,
+                   "--repeat", str(args.repeat), "--workdir", args.workdir, "--output", part]
+        subprocess.run(command, check=True)
+        with open(part) as f:
+            results += json.load(f)
+
+    report = {
+        "benchmark": "api",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment(),
+        "repeat": args.repeat,
+        "tiers": {tier: SCALES[tier] for tier in args.tiers},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression['tier']} {regression['name']}: {regression['before']}s -> {regression['after']}s (x{regression['ratio']})")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+if __name__ == "__main__":
+    main()
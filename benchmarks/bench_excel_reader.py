@@ -0,0 +1,85 @@
+"""
+Compares the Excel engines behind api.excel_reader on synthetic consumption workbooks.
+
+Run from the repository root:
+    python -m benchmarks.bench_excel_reader --rows 10000 100000 1000000 --output bench_excel.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from api.excel_reader import available_engines, read_excel
+from benchmarks.synthetic_data import write_workbook
+
+COLUMNS = ["Material Number", "Plant", "Site", "Vendor Number", "Pstng Date", "Quantity", "SLED/BBD", "Batch"]
+PROJECTED_COLUMNS = ["Material Number", "Plant", "Pstng Date", "Quantity"]
+
+def synthetic_consumption(rows, seed=0):
+    """Material-consumption-like frame with repetitive identifiers, dates and signed quantities."""
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2023-01-01")
+    return pd.DataFrame({
+        "Material Number": np.char.add("Material_", rng.integers(1, 5000, rows).astype(str)),
+        "Plant": np.char.add("Plant_", rng.integers(1, 20, rows).astype(str)),
+        "Site": np.char.add("Site_", rng.integers(1, 5, rows).astype(str)),
+        "Vendor Number": np.char.add("Vendor_", rng.integers(100, 900, rows).astype(str)),
+        "Pstng Date": start + rng.integers(0, 365 * 24 * 60, rows).astype("timedelta64[m]"),
+        "Quantity": rng.integers(-500, 500, rows),
+        "SLED/BBD": start + rng.integers(0, 730, rows).astype("timedelta64[D]"),
+        "Batch": np.char.add("Batch_", rng.integers(1, 100000, rows).astype(str)),
+    })[COLUMNS]
+
+def workbook_for(rows, workdir):
+    path = os.path.join(workdir, f"synthetic_consumption_{rows}.xlsx")
+    if not os.path.exists(path):
+        print(f"Generating {path} ...")
+        write_workbook(synthetic_consumption(rows), path)
+    return path
+
+def time_read(path, engine, usecols, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        df = read_excel(path, usecols=usecols, engine=engine)
+        timings.append(time.perf_counter() - started)
+    return min(timings), len(df)
+
+def run(rows_list, engines, repeat, workdir):
+    results = []
+    for rows in rows_list:
+        path = workbook_for(rows, workdir)
+        for engine in engines:
+            for label, usecols in (("all columns", None), ("projected", PROJECTED_COLUMNS)):
+                seconds, parsed_rows = time_read(path, engine, usecols, repeat)
+                results.append({
+                    "rows": rows,
+                    "engine": engine,
+                    "columns": label,
+                    "seconds": round(seconds, 4),
+                    "rows_per_second": round(parsed_rows / seconds) if seconds else None,
+                    "file_bytes": os.path.getsize(path),
+                })
+                print(f"{rows:>9} rows  {engine:<9} {label:<12} {seconds:8.3f}s")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--engines", nargs="+", default=available_engines())
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per measurement, the fastest is reported")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "capstone_bench"))
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    results = run(args.rows, args.engines, args.repeat, args.workdir)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "excel_reader", "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Synthetic datasets shaped like the dashboard's uploads, at configurable scale.
+
+Generates material-consumption, goods-receipt and order-placement transactions,
+weekly WW{n}.xlsx shortage snapshots (plus the ZIP and waterfall JSON built from
+them) and the WW{i}_Consumption table the forecast models take.
+
+Run from the repository root:
+    python -m benchmarks.synthetic_data --tier medium --out /tmp/capstone_data
+    python -m benchmarks.synthetic_data --materials 2000 --weeks 52 --rows 500000 --out /tmp/capstone_data
+"""
+import argparse
+import json
+import os
+import zipfile
+import numpy as np
+import pandas as pd
+
+# materials x weekly snapshots x transaction rows per file
+SCALES = {
+    "small": {"materials": 50, "weeks": 4, "rows": 10_000},
+    "medium": {"materials": 500, "weeks": 13, "rows": 100_000},
+    "large": {"materials": 5_000, "weeks": 52, "rows": 1_000_000},
+}
+
+WEEKS_PER_YEAR = 52
+WEEK_COLUMNS = [f"WW{i:02d}" for i in range(1, WEEKS_PER_YEAR + 1)]
+CONSUMPTION_COLUMNS = [f"WW{i}_Consumption" for i in range(1, WEEKS_PER_YEAR + 1)]
+# Measures of a shortage snapshot, as listed on the waterfall page
+MEASURES = ["Demand w/o Buffer", "Supply", "Expired", "EOH w/o Buffer", "EOH with Buffer", "Weeks of Stock"]
+# SAP export date formats, as in test-upload.csv
+CSV_DATETIME_FORMAT = "%d/%m/%Y %I:%M:%S %p"
+CSV_DATE_FORMAT = "%d/%m/%Y"
+START_DATE = np.datetime64("2024-01-01")
+
+def _labels(prefix, values):
+    return np.char.add(prefix, values.astype(str))
+
+def material_numbers(materials):
+    return _labels("Material_", np.arange(1, materials + 1))
+
+def material_locations(materials, seed=0):
+    """The (Plant, Site) each material is stocked at, fixed per material."""
+    rng = np.random.default_rng(seed)
+    plants = _labels("Plant_", rng.integers(1, 21, materials))
+    sites = _labels("Site_", rng.integers(1, 6, materials))
+    return pd.DataFrame({"Material Number": material_numbers(materials), "Plant": plants, "Site": sites})
+
+def _transactions(rows, materials, rng, seed=0):
+    """Rows drawn with a skewed material popularity, as in real consumption data."""
+    locations = material_locations(materials, seed)
+    weights = 1.0 / np.arange(1, materials + 1)
+    picks = rng.choice(materials, size=rows, p=weights / weights.sum())
+    return locations.iloc[picks].reset_index(drop=True)
+
+def material_consumption(rows, materials, seed=0):
+    """Material-consumption export: mostly negative quantities (goods issues), batches and shelf-life dates."""
+    rng = np.random.default_rng(seed)
+    df = _transactions(rows, materials, rng, seed)
+    df.insert(0, "Material Group", rng.integers(100, 120, rows))
+    df["Vendor Number"] = _labels("Vendor_", rng.integers(100, 900, rows))
+    df["Pstng Date"] = START_DATE + rng.integers(0, 365 * 24 * 60, rows).astype("timedelta64[m]")
+    df["Quantity"] = np.where(rng.random(rows) < 0.9, -1, 1) * rng.integers(1, 500, rows)
+    df["BUn"] = "EA"
+    df["Batch"] = _labels("Batch_", rng.integers(1, max(rows // 10, 2), rows))
+    df["SLED/BBD"] = START_DATE + rng.integers(30, 730, rows).astype("timedelta64[D]")
+    return df
+
+def order_placement(rows, materials, seed=0):
+    """Purchase orders: document date, ordered quantity, supplier."""
+    rng = np.random.default_rng(seed + 1)
+    df = _transactions(rows, materials, rng, seed).drop(columns="Site")
+    df["Purchasing Document"] = _labels("45", 10_000_000 + rng.integers(0, max(rows // 2, 1), rows))
+    df["Document Date"] = START_DATE + rng.integers(0, 365, rows).astype("timedelta64[D]")
+    df["Order Quantity"] = rng.integers(10, 5_000, rows)
+    df["Supplier"] = _labels("Supplier_", rng.integers(1, 200, rows))
+    df["Vendor Number"] = _labels("Vendor_", rng.integers(100, 900, rows))
+    return df
+
+def goods_receipt(rows, materials, seed=0):
+    """Goods receipts of the generated purchase orders, posted a lead time after their document date."""
+    rng = np.random.default_rng(seed + 2)
+    orders = order_placement(rows, materials, seed)
+    sites = material_locations(materials, seed).set_index("Material Number")["Site"]
+    df = orders[["Material Number", "Plant", "Purchasing Document", "Vendor Number", "Supplier"]].copy()
+    df.insert(2, "Site", sites.reindex(df["Material Number"]).to_numpy())
+    lead_time = rng.integers(24 * 60, 90 * 24 * 60, rows).astype("timedelta64[m]")
+    df["Pstng Date"] = orders["Document Date"].to_numpy() + lead_time
+    df["Quantity"] = np.ceil(orders["Order Quantity"].to_numpy() * rng.uniform(0.5, 1.0, rows)).astype(int)
+    df["Batch"] = _labels("Batch_", rng.integers(1, max(rows // 10, 2), rows))
+    df["SLED/BBD"] = START_DATE + rng.integers(30, 730, rows).astype("timedelta64[D]")
+    return df
+
+def shortage_snapshot(week, materials, seed=0):
+    """
+    The WW{week} shortage report: one row per material and measure, with projections for WW01..WW52.
+
+    Weeks of Stock drifts around each material's lead time from one snapshot to the
+    next, so the waterfall has realistic actual-vs-predicted gaps.
+    """
+    rng = np.random.default_rng(seed * 1000 + week)
+    base = np.random.default_rng(seed)
+    locations = material_locations(materials, seed)
+    lead_time = base.integers(2, 16, materials)
+    level = base.uniform(0.5, 3.0, materials)[:, None] * lead_time[:, None]
+    drift = rng.normal(0, 0.5, (materials, WEEKS_PER_YEAR)).cumsum(axis=1)
+
+    frames = []
+    for measure in MEASURES:
+        if measure == "Weeks of Stock":
+            values = np.round(level + drift, 1)
+        elif measure == "Expired":
+            values = rng.poisson(0.2, (materials, WEEKS_PER_YEAR)).astype(float)
+        else:
+            values = np.round(rng.gamma(2.0, 50.0, (materials, WEEKS_PER_YEAR)), 0)
+        # Projections start at the snapshot's own week; earlier weeks are blank
+        values[:, : week - 1] = np.nan
+        frame = locations.copy()
+        frame["Measures"] = measure
+        frame["Inventory\nOn-Hand"] = np.round(level[:, 0] * 100)
+        frame["Lead Time (Week)"] = lead_time
+        frame[WEEK_COLUMNS] = values
+        frames.append(frame)
+    return pd.concat(frames).sort_index(kind="stable").reset_index(drop=True)
+
+def consumption_wide(materials, seed=0):
+    """One row per material with WW1_Consumption..WW52_Consumption, the forecast models' input."""
+    rng = np.random.default_rng(seed + 3)
+    weeks = np.arange(1, WEEKS_PER_YEAR + 1)
+    scale = rng.uniform(5, 200, materials)[:, None]
+    seasonal = 1 + 0.3 * np.sin(2 * np.pi * (weeks + rng.integers(0, 52, materials)[:, None]) / WEEKS_PER_YEAR)
+    values = rng.poisson(scale * seasonal).astype(float)
+    df = pd.DataFrame(values, columns=CONSUMPTION_COLUMNS)
+    df.insert(0, "Material Number", material_numbers(materials))
+    return df
+
+def external_consumption(series, years=(2023,), seed=0):
+    """Earlier years of a weekly series (Year / Week / Consumption), the v2/v3 models' external data."""
+    rng = np.random.default_rng(seed + 4)
+    frames = []
+    for year in years:
+        noise = rng.normal(1.0, 0.15, WEEKS_PER_YEAR).clip(0)
+        frames.append(pd.DataFrame({
+            "Year": year,
+            "Week": np.arange(1, WEEKS_PER_YEAR + 1),
+            "Consumption": np.round(np.asarray(series, dtype=float) * noise),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+WRITE_CHUNK_ROWS = 50_000
+
+def write_workbook(df, path):
+    """
+    Writes df as .xlsx, row by row in xlsxwriter's constant-memory mode when it is installed.
+
+    pandas' to_excel writes column by column, which constant-memory mode silently
+    drops (only the first column survives), so the rows are written here directly.
+    """
+    try:
+        import xlsxwriter
+    except ImportError:
+        df.to_excel(path, index=False, engine="openpyxl")
+        return
+
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    try:
+        worksheet = workbook.add_worksheet("Sheet1")
+        date_format = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+        worksheet.write_row(0, 0, [str(col) for col in df.columns])
+        date_columns = [i for i, col in enumerate(df.columns) if pd.api.types.is_datetime64_any_dtype(df[col])]
+        for start in range(0, len(df), WRITE_CHUNK_ROWS):
+            chunk = df.iloc[start:start + WRITE_CHUNK_ROWS]
+            # Native Python values, with missing cells left blank
+            rows = chunk.astype(object).where(chunk.notna(), None).to_numpy().tolist()
+            for offset, row in enumerate(rows):
+                row_number = start + offset + 1
+                worksheet.write_row(row_number, 0, row)
+                for col in date_columns:
+                    if row[col] is not None:
+                        worksheet.write_datetime(row_number, col, row[col].to_pydatetime(), date_format)
+    finally:
+        workbook.close()
+
+def write_csv(df, path):
+    """Writes df as CSV with dates in the SAP export formats."""
+    df = df.copy()
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            has_time = (df[col].dt.normalize() != df[col]).any()
+            df[col] = df[col].dt.strftime(CSV_DATETIME_FORMAT if has_time else CSV_DATE_FORMAT)
+    df.to_csv(path, index=False)
+
+def write_table(df, path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        write_csv(df, path)
+    elif extension == ".parquet":
+        df.to_parquet(path, index=False)
+    else:
+        write_workbook(df, path)
+
+def waterfall_records(snapshots):
+    """The bucket's waterfall JSON layout: an array with one array of records per week (WW01 first)."""
+    groups = []
+    for week in range(1, WEEKS_PER_YEAR + 1):
+        df = snapshots.get(week)
+        groups.append([] if df is None else json.loads(df.to_json(orient="records")))
+    return groups
+
+def generate(out_dir, materials, weeks, rows, formats=("xlsx", "csv"), seed=0):
+    """
+    Writes a full synthetic dataset to out_dir and returns its manifest.
+
+    Files:
+        material_consumption.<fmt>, goods_receipt.<fmt>, order_placement.<fmt>
+        shortage/WW{n}.xlsx for n = 1..weeks, shortage.zip with the same files,
+        waterfall.json (bucket layout), consumption_wide.xlsx, manifest.json
+
+    Returns:
+        dict: Scale parameters, file paths and a sample (material, plant, site) to query.
+    """
+    os.makedirs(os.path.join(out_dir, "shortage"), exist_ok=True)
+    files = {}
+    for name, make in (("material_consumption", material_consumption), ("goods_receipt", goods_receipt), ("order_placement", order_placement)):
+        df = make(rows, materials, seed)
+        for file_format in formats:
+            path = os.path.join(out_dir, f"{name}.{file_format}")
+            write_table(df, path)
+            files[f"{name}.{file_format}"] = path
+
+    snapshots = {week: shortage_snapshot(week, materials, seed) for week in range(1, weeks + 1)}
+    zip_path = os.path.join(out_dir, "shortage.zip")
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for week, df in snapshots.items():
+            path = os.path.join(out_dir, "shortage", f"WW{week}.xlsx")
+            write_workbook(df, path)
+            archive.write(path, f"WW{week}.xlsx")
+    files["shortage_dir"] = os.path.join(out_dir, "shortage")
+    files["shortage.zip"] = zip_path
+
+    waterfall_path = os.path.join(out_dir, "waterfall.json")
+    with open(waterfall_path, "w") as f:
+        json.dump(waterfall_records(snapshots), f)
+    files["waterfall.json"] = waterfall_path
+
+    wide_path = os.path.join(out_dir, "consumption_wide.xlsx")
+    write_workbook(consumption_wide(materials, seed), wide_path)
+    files["consumption_wide.xlsx"] = wide_path
+
+    sample = material_locations(materials, seed).iloc[0]
+    manifest = {
+        "materials": materials,
+        "weeks": weeks,
+        "rows": rows,
+        "seed": seed,
+        "files": files,
+        "sample": {"material": sample["Material Number"], "plant": sample["Plant"], "site": sample["Site"]},
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def load_or_generate(out_dir, materials, weeks, rows, formats=("xlsx", "csv"), seed=0):
+    """Reuses the dataset in out_dir when it was generated with the same parameters."""
+    try:
+        with open(os.path.join(out_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+        if (manifest["materials"], manifest["weeks"], manifest["rows"], manifest["seed"]) == (materials, weeks, rows, seed) and all(
+            os.path.exists(path) for path in manifest["files"].values()
+        ) and all(f"material_consumption.{file_format}" in manifest["files"] for file_format in formats):
+            return manifest
+    except (OSError, ValueError, KeyError):
+        pass
+    print(f"Generating {materials} materials x {weeks} weeks x {rows} rows in {out_dir} ...")
+    return generate(out_dir, materials, weeks, rows, formats, seed)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tier", choices=SCALES, default="small")
+    parser.add_argument("--materials", type=int, help="Overrides the tier's number of materials")
+    parser.add_argument("--weeks", type=int, help="Overrides the tier's number of weekly snapshots (1-52)")
+    parser.add_argument("--rows", type=int, help="Overrides the tier's transaction rows per file")
+    parser.add_argument("--formats", nargs="+", default=["xlsx", "csv"], choices=["xlsx", "csv", "parquet"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True, help="Output directory")
+    args = parser.parse_args()
+
+    scale = dict(SCALES[args.tier])
+    for name in ("materials", "weeks", "rows"):
+        if getattr(args, name):
+            scale[name] = getattr(args, name)
+    if not 1 <= scale["weeks"] <= WEEKS_PER_YEAR:
+        parser.error(f"--weeks must be between 1 and {WEEKS_PER_YEAR}")
+    manifest = generate(args.out, scale["materials"], scale["weeks"], scale["rows"], args.formats, args.seed)
+    print(json.dumps(manifest, indent=2))
+
+if __name__ == "__main__":
+    main()